@@ -0,0 +1,114 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: asyncio front end for the graph classes. Queries run on a bounded thread pool against frozen snapshots
+# of the graph (see freeze()), so long searches never block the event loop. Identical queries that are in flight at
+# the same time share one computation, and every call can be cancelled or given a timeout.
+#
+# Example:
+#     graph = AsyncGraph(DirectedGraph(edges), timeout=2.0)
+#     distances = await graph.dijkstra(0)
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from query_cache import copy_result, hashable_key
+
+
+class AsyncGraph:
+    """
+    Class to implement an asyncio facade over a DirectedGraph or UndirectedGraph
+    - query(name, ...) and the matching coroutine attributes (await graph.bfs('A')) run the read queries of the
+      graph's frozen snapshots, e.g. dfs, bfs, dijkstra, shortest_path, is_valid_path and get_edges
+    - each query freezes the graph on the event loop thread and computes on the executor, so the graph can keep
+      being modified through its own synchronous methods, from the event loop thread, while queries run
+    - queries with the same name, arguments and graph version that are in flight together are computed once and
+      every caller gets its own copy of the result
+    - a caller that is cancelled or times out stops waiting without cancelling the computation for the others; a
+      computation with no callers left is cancelled if it has not started yet
+    """
+
+    def __init__(self, graph, max_workers=1, timeout=None, processes=False, executor=None):
+        """
+        Wraps graph. Queries run on executor, or on a new pool of max_workers threads, or worker processes with
+        processes, that close() shuts down. The queries are pure Python, so threads hold the GIL while they compute
+        and more of them add event loop latency rather than throughput; worker processes keep the event loop
+        responsive under load, at the cost of pickling the snapshot with every computation. timeout is the default
+        number of seconds a query may wait for its result, None to wait indefinitely.
+        """
+        self.graph = graph
+        self.timeout = timeout
+        self.computations = 0
+        self.coalesced = 0
+        self._owns_executor = executor is None
+        if executor is None and processes:
+            executor = ProcessPoolExecutor(max_workers)
+        elif executor is None:
+            executor = ThreadPoolExecutor(max_workers, thread_name_prefix='graph-query')
+        self._executor = executor
+        # (name, args, kwargs, version) -> [future, number of callers waiting for it]
+        self._inflight = {}
+
+    def __getattr__(self, name: str):
+        """
+        Returns a coroutine function running the query name, so graph.dijkstra(0) is graph.query('dijkstra', 0)
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return partial(self.query, name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    async def query(self, name: str, *args, timeout=None, **kwargs):
+        """
+        Runs the snapshot query name(*args, **kwargs) off the event loop and returns its result. Raises
+        AttributeError if snapshots do not answer the query, and TimeoutError if it does not finish within timeout
+        seconds (the default timeout if not provided).
+        """
+        snapshot = self.graph.freeze()
+        method = None if name.startswith('_') else getattr(snapshot, name, None)
+        if not callable(method):
+            raise AttributeError(f'{type(snapshot).__name__} has no query {name!r}')
+
+        key = (name, hashable_key(args), hashable_key(kwargs), snapshot.version)
+        entry = self._inflight.get(key)
+        if entry is None or entry[0].cancelled():
+            future = asyncio.get_running_loop().run_in_executor(self._executor, partial(method, *args, **kwargs))
+            entry = self._inflight[key] = [future, 0]
+            future.add_done_callback(partial(self._finished, key, entry))
+            self.computations += 1
+        else:
+            self.coalesced += 1
+
+        entry[1] += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(entry[0]), self.timeout if timeout is None else timeout)
+        except (asyncio.CancelledError, TimeoutError):
+            if entry[1] == 1:
+                # the last caller gave up: drop a computation that has not started yet, and forget it now so a retry
+                # is not coalesced onto the cancelled future before its done callback runs
+                if entry[0].cancel() and self._inflight.get(key) is entry:
+                    del self._inflight[key]
+            raise
+        finally:
+            entry[1] -= 1
+        return copy_result(result)
+
+    def _finished(self, key: tuple, entry: list, future) -> None:
+        """
+        Helper function which forgets a computation once it is done, so later calls compute a fresh result
+        """
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def close(self) -> None:
+        """
+        Shuts down the pool created by the constructor, cancelling the queries that have not started
+        """
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
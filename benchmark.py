@@ -0,0 +1,217 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Reproducible benchmarks for DirectedGraph and UndirectedGraph. Builds graphs from seeded generators
+# (Erdos-Renyi, Barabasi-Albert, grid and random DAG), times the public methods on them and records peak memory,
+# then writes the results as JSON so two runs can be diffed.
+#
+# Example: python benchmark.py --sizes 100,1000,10000 --output before.json
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from d_graph import DirectedGraph
+from ud_graph import UndirectedGraph
+
+
+def erdos_renyi(n: int, m: int, seed: int) -> []:
+    """
+    Returns m edges (u, v) drawn uniformly at random between n vertices (the G(n, m) model; loops and repeats are
+    left for the graph to drop)
+    """
+    rnd = random.Random(seed)
+    return [(rnd.randrange(n), rnd.randrange(n)) for _ in range(m)]
+
+
+def barabasi_albert(n: int, m: int, seed: int) -> []:
+    """
+    Returns the edges of a Barabasi-Albert preferential attachment graph with n vertices, where each new vertex
+    links to about m / n existing vertices picked with probability proportional to their degree
+    """
+    rnd = random.Random(seed)
+    k = max(1, m // max(1, n))
+    edges = []
+    # every edge endpoint is listed once, so a uniform pick from it is a degree-weighted pick of a vertex
+    endpoints = list(range(min(k, n)))
+    for v in range(min(k, n), n):
+        targets = {rnd.choice(endpoints) for _ in range(k)}
+        for u in targets:
+            edges.append((v, u))
+            endpoints.extend((u, v))
+    return edges
+
+
+def grid(n: int, m: int, seed: int) -> []:
+    """
+    Returns the edges of a square grid of about n vertices, linking each vertex to its right and lower neighbour like
+    a road network. m is ignored and edges go from the lower to the higher numbered vertex, in a seeded order.
+    """
+    side = max(1, math.isqrt(n))
+    edges = []
+    for y in range(side):
+        for x in range(side):
+            v = y * side + x
+            if x + 1 < side:
+                edges.append((v, v + 1))
+            if y + 1 < side:
+                edges.append((v, v + side))
+    random.Random(seed).shuffle(edges)
+    return edges
+
+
+def random_dag(n: int, m: int, seed: int) -> []:
+    """
+    Returns m random edges between n vertices that all go from a lower to a higher numbered vertex
+    """
+    rnd = random.Random(seed)
+    edges = []
+    for _ in range(m):
+        u, v = rnd.randrange(n), rnd.randrange(n)
+        edges.append((min(u, v), max(u, v)))
+    return edges
+
+
+GENERATORS = {'erdos-renyi': erdos_renyi, 'barabasi-albert': barabasi_albert, 'grid': grid, 'dag': random_dag}
+
+
+def _directed_operations(edges: [], n: int, storage: str, seed: int) -> []:
+    """
+    Helper function which returns (operation, function) pairs benchmarking a DirectedGraph. The first operation
+    builds the graph with add_edge(), the others run on it. Edge weights are seeded random integers.
+    """
+    rnd = random.Random(seed)
+    weighted = [(u, v, rnd.randint(1, 100)) for u, v in edges]
+    graph = DirectedGraph()
+
+    def build():
+        graph.set_storage(storage)
+        graph.add_vertices(n)
+        for u, v, weight in weighted:
+            graph.add_edge(u, v, weight)
+
+    return [
+        ('add_edge', build),
+        ('get_edges', graph.get_edges),
+        ('dfs', lambda: graph.dfs(0)),
+        ('bfs', lambda: graph.bfs(0)),
+        ('has_cycle', graph.has_cycle),
+        ('dijkstra', lambda: graph.dijkstra(0)),
+    ]
+
+
+def _undirected_operations(edges: [], n: int, storage: str, seed: int) -> []:
+    """
+    Helper function which returns (operation, function) pairs benchmarking an UndirectedGraph with string vertex
+    names. The first operation builds the graph with add_edge(), the others run on it.
+    """
+    named = [(str(u), str(v)) for u, v in edges]
+    graph = UndirectedGraph()
+
+    def build():
+        for u, v in named:
+            graph.add_edge(u, v)
+
+    return [
+        ('add_edge', build),
+        ('get_edges', graph.get_edges),
+        ('dfs', lambda: graph.dfs('0')),
+        ('bfs', lambda: graph.bfs('0')),
+        ('has_cycle', graph.has_cycle),
+        ('count_connected_components', graph.count_connected_components),
+    ]
+
+
+def run_case(kind: str, storage, generator: str, n: int, degree: int, seed: int, repeat: int, memory: bool) -> []:
+    """
+    Benchmarks one graph class / storage / generator / size combination and returns a list of result dicts, one per
+    operation. Every repetition starts from a new graph, so cached answers such as has_cycle() are timed once per
+    repetition; the fastest repetition is reported. With memory, one more repetition runs under tracemalloc and
+    records the peak bytes allocated by each operation.
+    """
+    edges = GENERATORS[generator](n, degree * n, seed)
+    make_operations = _directed_operations if kind == 'directed' else _undirected_operations
+
+    seconds = {}
+    for _ in range(repeat):
+        for name, operation in make_operations(edges, n, storage, seed):
+            start = time.perf_counter()
+            operation()
+            elapsed = time.perf_counter() - start
+            seconds[name] = min(elapsed, seconds.get(name, elapsed))
+
+    peak_bytes = {}
+    if memory:
+        tracemalloc.start()
+        try:
+            for name, operation in make_operations(edges, n, storage, seed):
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                operation()
+                peak_bytes[name] = tracemalloc.get_traced_memory()[1] - current
+        finally:
+            tracemalloc.stop()
+
+    return [{
+        'graph': kind,
+        'storage': storage,
+        'generator': generator,
+        'vertices': n,
+        'edges': len(edges),
+        'operation': name,
+        'seconds': round(seconds[name], 6),
+        'peak_bytes': peak_bytes.get(name),
+    } for name in seconds]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark DirectedGraph and UndirectedGraph on generated graphs.')
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma separated vertex counts, e.g. 100,1000,10000,100000,1000000')
+    parser.add_argument('--generators', default=','.join(GENERATORS), help='comma separated generator names')
+    parser.add_argument('--graphs', default='directed,undirected', help='graph classes to benchmark')
+    parser.add_argument('--storage', default='dense,sparse', help='DirectedGraph storage backends to benchmark')
+    parser.add_argument('--degree', type=int, default=4, help='average number of edges per vertex')
+    parser.add_argument('--dense-limit', type=int, default=5000,
+                        help='largest vertex count benchmarked with dense storage, which needs V^2 cells')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1, help='repetitions per case, the fastest is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory pass')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in (int(size) for size in args.sizes.split(',')):
+        for generator in args.generators.split(','):
+            for kind in args.graphs.split(','):
+                for storage in args.storage.split(',') if kind == 'directed' else [None]:
+                    if storage == 'dense' and n > args.dense_limit:
+                        continue
+                    label = kind if storage is None else f'{kind}/{storage}'
+                    print(f'{label} {generator} n={n}', file=sys.stderr)
+                    results.extend(run_case(kind, storage, generator, n, args.degree, args.seed, args.repeat,
+                                            not args.no_memory))
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'degree': args.degree,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,493 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Compressed sparse row (CSR) adjacency arrays shared by the graph implementations. Each row holds the
+# out-edges of one vertex as a contiguous slice of typed target and weight arrays. Also implements strongly connected
+# components and a level-synchronous, direction-optimizing breadth-first search that run directly on CSR arrays, and
+# the block-wise copy-on-write row tables behind frozen graph snapshots.
+
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from multiprocessing import shared_memory
+
+
+class CSR:
+    """
+    Class to implement compressed sparse row adjacency
+    - offsets[u]:offsets[u + 1] is the slice of targets/weights holding the edges of vertex u
+    - targets within a row are kept in ascending order
+    - weights are stored as integers until the first non-integer weight is added
+    - an unweighted CSR has no weights array and reports a weight of 1 for every edge
+    """
+
+    def __init__(self, offsets=None, targets=None, weights=None, weighted=True):
+        """
+        Wrap existing offset/target/weight buffers, or create an empty CSR with no rows
+        """
+        self.offsets = offsets if offsets is not None else array('q', [0])
+        self.targets = targets if targets is not None else array('q')
+        self.weights = None
+        if weighted:
+            self.weights = weights if weights is not None else array('q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a CSR from an iterable of rows, each row being an ascending list of (target, weight) tuples
+        """
+        csr = cls()
+        for row in rows:
+            for v, w in row:
+                csr.targets.append(v)
+                csr._append_weight(w)
+            csr.offsets.append(len(csr.targets))
+        return csr
+
+    @classmethod
+    def from_buffer(cls, buffer, n_rows: int, n_edges: int, weight_typecode):
+        """
+        Wrap a buffer laid out by to_buffer() without copying it. The arrays are read-only memoryviews.
+        A weight_typecode of None means the CSR is unweighted.
+        """
+        view = memoryview(buffer).toreadonly()
+        end_offsets = 8 * (n_rows + 1)
+        end_targets = end_offsets + 8 * n_edges
+        offsets = view[:end_offsets].cast('q')
+        targets = view[end_offsets:end_targets].cast('q')
+        if weight_typecode is None:
+            return cls(offsets, targets, weighted=False)
+        return cls(offsets, targets, view[end_targets:end_targets + 8 * n_edges].cast(weight_typecode))
+
+    def _parts(self) -> ():
+        """
+        Helper function which returns the arrays making up the CSR
+        """
+        if self.weights is None:
+            return self.offsets, self.targets
+        return self.offsets, self.targets, self.weights
+
+    def weight_typecode(self):
+        """
+        Returns the array typecode of the weights, or None for an unweighted CSR. Weights wrapped from a buffer are
+        memoryviews, which report their typecode as format.
+        """
+        if self.weights is None:
+            return None
+        return getattr(self.weights, 'typecode', None) or self.weights.format
+
+    def buffer_size(self) -> int:
+        """
+        Returns the number of bytes to_buffer() writes
+        """
+        return 8 * sum(len(part) for part in self._parts())
+
+    def to_buffer(self, buffer) -> None:
+        """
+        Copies offsets, targets and weights back to back into a writable buffer of at least buffer_size() bytes
+        """
+        view = memoryview(buffer)
+        pos = 0
+        for part in self._parts():
+            data = memoryview(part).cast('B')
+            view[pos:pos + len(data)] = data
+            pos += len(data)
+
+    def to_shared(self) -> (shared_memory.SharedMemory, tuple):
+        """
+        Copies the CSR into a new shared memory block. Returns the block, which the caller must close and unlink,
+        and a picklable descriptor for attach_shared().
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(1, self.buffer_size()))
+        try:
+            self.to_buffer(shm.buf)
+            return shm, (shm.name, len(self), self.num_edges(), self.weight_typecode())
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @classmethod
+    def attach_shared(cls, descriptor: tuple) -> (shared_memory.SharedMemory, 'CSR'):
+        """
+        Attaches to a shared memory block created by to_shared() and returns the block and a CSR viewing it
+        """
+        name, n_rows, n_edges, weight_typecode = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, cls.from_buffer(shm.buf, n_rows, n_edges, weight_typecode)
+
+    # ------------------------------------------------------------------ #
+    def _append_weight(self, weight) -> None:
+        """
+        Helper function which appends a weight, widening the weight array to floats if required
+        """
+        try:
+            self.weights.append(weight)
+        except (TypeError, OverflowError):
+            self.weights = array('d', self.weights)
+            self.weights.append(weight)
+
+    def __len__(self):
+        """
+        Returns the number of rows
+        """
+        return len(self.offsets) - 1
+
+    def num_edges(self) -> int:
+        """
+        Returns the number of stored edges
+        """
+        return len(self.targets)
+
+    def row(self, u: int) -> []:
+        """
+        Returns the edges of row u as an ascending list of (target, weight) tuples
+        """
+        start, end = self.offsets[u], self.offsets[u + 1]
+        if self.weights is None:
+            return [(v, 1) for v in self.targets[start:end]]
+        return list(zip(self.targets[start:end], self.weights[start:end]))
+
+    def degree(self, u: int) -> int:
+        """
+        Returns the number of edges in row u
+        """
+        return self.offsets[u + 1] - self.offsets[u]
+
+    def transpose(self) -> 'CSR':
+        """
+        Returns a new CSR with every edge reversed, so row v lists the sources of the edges into v in ascending order
+        """
+        n = len(self)
+        offsets = array('q', bytes(8 * (n + 1)))
+        for v in self.targets:
+            offsets[v + 1] += 1
+        for v in range(n):
+            offsets[v + 1] += offsets[v]
+
+        targets = array('q', bytes(8 * self.num_edges()))
+        weights = None
+        if self.weights is not None:
+            weights = array(self.weight_typecode(), bytes(8 * self.num_edges()))
+        free = offsets[:n]
+        for u in range(n):
+            for i in range(self.offsets[u], self.offsets[u + 1]):
+                v = self.targets[i]
+                targets[free[v]] = u
+                if weights is not None:
+                    weights[free[v]] = self.weights[i]
+                free[v] += 1
+
+        return CSR(offsets, targets, weights, weighted=weights is not None)
+
+    def neighbors(self, u: int):
+        """
+        Returns the targets of row u, without weights
+        """
+        return self.targets[self.offsets[u]:self.offsets[u + 1]]
+
+    def get(self, u: int, v: int):
+        """
+        Returns the weight stored at (u, v), or 0 if there is no such edge
+        """
+        start, end = self.offsets[u], self.offsets[u + 1]
+        i = bisect_left(self.targets, v, start, end)
+        if i < end and self.targets[i] == v:
+            return 1 if self.weights is None else self.weights[i]
+        return 0
+
+
+def pack_rows(rows) -> ([], array):
+    """
+    Packs an iterable of variable length rows, such as paths, into a flat list and a CSR style offsets array where
+    row i is flat[offsets[i]:offsets[i + 1]]
+    """
+    flat = []
+    offsets = array('q', [0])
+    for row in rows:
+        flat.extend(row)
+        offsets.append(len(flat))
+    return flat, offsets
+
+
+class FrozenRows:
+    """
+    Class to implement an immutable adjacency table for graph snapshots
+    - rows are grouped into blocks of 2 ** BLOCK_BITS consecutive rows, each block stored as a small CSR
+    - replace() returns a new table sharing every block that holds no changed row, so a table for the next
+      version of a graph costs the changed blocks plus a copy of the list of block references
+    - a table is never modified once built, so any number of threads can read it without locking
+    """
+
+    BLOCK_BITS = 6
+
+    def __init__(self, blocks=(), n=0, weighted=True):
+        self._blocks = blocks
+        self._n = n
+        self._weighted = weighted
+
+    def __len__(self):
+        return self._n
+
+    @classmethod
+    def from_rows(cls, row, n: int, weighted=True) -> 'FrozenRows':
+        """
+        Builds a table of n rows, reading row u with row(u): an ascending list of (target, weight) tuples, or an
+        iterable of targets if not weighted
+        """
+        return cls((), 0, weighted).replace(row, (), n)
+
+    def replace(self, row, changed, n: int) -> 'FrozenRows':
+        """
+        Returns a table of n rows where the rows in changed, and any rows past the current end, are read again with
+        row(u); every other row is shared with this table
+        """
+        bits = self.BLOCK_BITS
+        size = 1 << bits
+        blocks = list(self._blocks[:(n + size - 1) >> bits])
+        rebuild = {u >> bits for u in changed if u < n}
+        rebuild.update(range(self._n >> bits, (n + size - 1) >> bits))
+        blocks.extend(None for _ in range(len(blocks), (n + size - 1) >> bits))
+        for b in rebuild:
+            blocks[b] = self._block(row, b << bits, min(n, (b + 1) << bits))
+        return FrozenRows(tuple(blocks), n, self._weighted)
+
+    def _block(self, row, start: int, end: int) -> CSR:
+        """
+        Helper function which packs rows start..end-1 into a CSR block
+        """
+        if self._weighted:
+            return CSR.from_rows(row(u) for u in range(start, end))
+        offsets = array('q', [0])
+        targets = array('q')
+        for u in range(start, end):
+            targets.extend(row(u))
+            offsets.append(len(targets))
+        return CSR(offsets, targets, weighted=False)
+
+    def row(self, u: int) -> []:
+        """
+        Returns the edges of row u as an ascending list of (target, weight) tuples
+        """
+        return self._blocks[u >> self.BLOCK_BITS].row(u & ((1 << self.BLOCK_BITS) - 1))
+
+    def neighbors(self, u: int):
+        """
+        Returns the targets of row u, without weights
+        """
+        return self._blocks[u >> self.BLOCK_BITS].neighbors(u & ((1 << self.BLOCK_BITS) - 1))
+
+    def degree(self, u: int) -> int:
+        return self._blocks[u >> self.BLOCK_BITS].degree(u & ((1 << self.BLOCK_BITS) - 1))
+
+    def get(self, u: int, v: int):
+        """
+        Returns the weight stored at (u, v), or 0 if there is no such edge. Row u must be in ascending order.
+        """
+        return self._blocks[u >> self.BLOCK_BITS].get(u & ((1 << self.BLOCK_BITS) - 1), v)
+
+
+def strongly_connected_components(csr: CSR) -> (array, int):
+    """
+    Finds the strongly connected components with an iterative version of Tarjan's algorithm, so deep graphs do not
+    hit the recursion limit. Returns a tuple of an array holding the component of each vertex and the number of
+    components. Components are numbered in the order Tarjan's algorithm completes them, which is a reverse
+    topological order: every edge between two components goes to the lower numbered one.
+    """
+    n = len(csr)
+    offsets, targets = csr.offsets, csr.targets
+    index = array('q', [-1]) * n
+    low = array('q', [0]) * n
+    component = array('q', [-1]) * n
+    scc_stack = []
+    counter = 0
+    count = 0
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        scc_stack.append(root)
+        # each frame is a vertex and the position of the next edge to explore
+        call_stack = [(root, offsets[root])]
+        while len(call_stack) != 0:
+            u, pos = call_stack[-1]
+            end = offsets[u + 1]
+            while pos < end:
+                v = targets[pos]
+                pos += 1
+                if index[v] < 0:
+                    call_stack[-1] = (u, pos)
+                    index[v] = low[v] = counter
+                    counter += 1
+                    scc_stack.append(v)
+                    call_stack.append((v, offsets[v]))
+                    break
+                if component[v] < 0 and index[v] < low[u]:
+                    low[u] = index[v]
+            else:
+                call_stack.pop()
+                if low[u] == index[u]:
+                    while True:
+                        v = scc_stack.pop()
+                        component[v] = count
+                        if v == u:
+                            break
+                    count += 1
+                if len(call_stack) != 0:
+                    parent = call_stack[-1][0]
+                    if low[u] < low[parent]:
+                        low[parent] = low[u]
+    return component, count
+
+
+# level_bfs() direction switching thresholds
+ALPHA = 14
+BETA = 24
+
+# CSR and distance array shared with level_bfs() worker processes, set up once per worker
+_bfs_worker_state = None
+
+
+def _bfs_worker_init(csr_descriptor: tuple, distance_name: str, n: int) -> None:
+    """
+    Process pool initializer which attaches the worker to the shared CSR and distance array
+    """
+    global _bfs_worker_state
+    csr_shm, csr = CSR.attach_shared(csr_descriptor)
+    distance_shm = shared_memory.SharedMemory(name=distance_name)
+    _bfs_worker_state = (csr_shm, csr, distance_shm, distance_shm.buf[:8 * n].cast('q'))
+
+
+def _bfs_worker_expand(frontier: []) -> []:
+    """
+    Process pool task which returns (vertex, parent) pairs for the unvisited neighbours of a slice of the frontier,
+    in the order a serial top-down step would discover them
+    """
+    _, csr, _, distance = _bfs_worker_state
+    found = {}
+    for u in frontier:
+        for v in csr.neighbors(u):
+            if distance[v] < 0 and v not in found:
+                found[v] = u
+    return list(found.items())
+
+
+def level_bfs(csr: CSR, src: int, reverse=None, workers=None, parallel_frontier=4096) -> ([], array, array):
+    """
+    Breadth-first search from src which expands one whole level (frontier) at a time. Returns a tuple of the visit
+    order, an array of hop distances and an array of BFS tree parents, both -1 for vertices that were not reached.
+
+    If reverse (the transpose of csr, or csr itself for undirected graphs) is provided, a level switches to a
+    bottom-up step once the frontier has more edges than the unvisited part of the graph divided by ALPHA: each
+    unvisited vertex then looks for any parent in the frontier instead of the frontier scanning all its edges. It
+    switches back once the frontier shrinks below V / BETA vertices. Top-down levels discover vertices in the same
+    order as a queue-based BFS; a bottom-up level is ordered by the frontier position of each vertex's parent.
+
+    With workers, top-down levels with at least parallel_frontier vertices are split across a process pool that
+    reads the CSR and distance array from shared memory.
+    """
+    n = len(csr)
+    if workers is None or workers <= 1:
+        distance = array('q', [-1]) * n
+        return _level_bfs(csr, src, reverse, distance)
+
+    csr_shm, descriptor = csr.to_shared()
+    distance_shm = shared_memory.SharedMemory(create=True, size=max(8, 8 * n))
+    distance_shm.buf[:8 * n] = (array('q', [-1]) * n).tobytes()
+    distance = distance_shm.buf[:8 * n].cast('q')
+    try:
+        with multiprocessing.Pool(workers, _bfs_worker_init, (descriptor, distance_shm.name, n)) as pool:
+            order, _, parent = _level_bfs(csr, src, reverse, distance, pool, workers, parallel_frontier)
+        distance_copy = array('q', distance)
+    finally:
+        distance.release()
+        for shm in (csr_shm, distance_shm):
+            shm.close()
+            shm.unlink()
+    return order, distance_copy, parent
+
+
+def _level_bfs(csr: CSR, src: int, reverse, distance, pool=None, workers=1, parallel_frontier=0) -> ([], array, array):
+    """
+    Helper function which runs level_bfs() with a preallocated distance array and an optional process pool
+    """
+    n = len(csr)
+    parent = array('q', [-1]) * n
+    distance[src] = 0
+    order = [src]
+    frontier = [src]
+    level = 0
+    unexplored_edges = csr.num_edges() - csr.degree(src)
+    bottom_up = False
+    while len(frontier) != 0:
+        if reverse is not None:
+            if bottom_up:
+                bottom_up = len(frontier) * BETA >= n
+            else:
+                frontier_edges = sum(csr.degree(u) for u in frontier)
+                bottom_up = frontier_edges * ALPHA > unexplored_edges
+
+        if bottom_up:
+            frontier = _bottom_up_step(reverse, frontier, level, distance, parent)
+        elif pool is not None and len(frontier) >= parallel_frontier:
+            frontier = _parallel_top_down_step(pool, workers, frontier, level, distance, parent)
+        else:
+            frontier = _top_down_step(csr, frontier, level, distance, parent)
+
+        for v in frontier:
+            unexplored_edges -= csr.degree(v)
+        order.extend(frontier)
+        level += 1
+
+    return order, distance, parent
+
+
+def _top_down_step(csr: CSR, frontier: [], level: int, distance, parent: array) -> []:
+    """
+    Helper function which expands every frontier vertex's edges and returns the next frontier
+    """
+    next_frontier = []
+    for u in frontier:
+        for v in csr.neighbors(u):
+            if distance[v] < 0:
+                distance[v] = level + 1
+                parent[v] = u
+                next_frontier.append(v)
+    return next_frontier
+
+
+def _parallel_top_down_step(pool, workers: int, frontier: [], level: int, distance, parent: array) -> []:
+    """
+    Helper function which runs a top-down step with the frontier split into slices for the worker pool. The slices
+    are merged in frontier order, so the result matches _top_down_step().
+    """
+    chunk_size = max(1, len(frontier) // (4 * workers))
+    chunks = [frontier[i:i + chunk_size] for i in range(0, len(frontier), chunk_size)]
+    next_frontier = []
+    for found in pool.map(_bfs_worker_expand, chunks):
+        for v, u in found:
+            if distance[v] < 0:
+                distance[v] = level + 1
+                parent[v] = u
+                next_frontier.append(v)
+    return next_frontier
+
+
+def _bottom_up_step(reverse: CSR, frontier: [], level: int, distance, parent: array) -> []:
+    """
+    Helper function which lets every unvisited vertex search its incoming edges for a frontier vertex and returns
+    the next frontier
+    """
+    next_frontier = []
+    for v in range(len(reverse)):
+        if distance[v] < 0:
+            for u in reverse.neighbors(v):
+                if distance[u] == level:
+                    distance[v] = level + 1
+                    parent[v] = u
+                    next_frontier.append(v)
+                    break
+    position = {u: i for i, u in enumerate(frontier)}
+    next_frontier.sort(key=lambda v: position[parent[v]])
+    return next_frontier
@@ -5,7 +5,765 @@
 
 
 import heapq
+import multiprocessing
+import os
+import tempfile
+from array import array
 from collections import deque
+from itertools import compress, islice, repeat
+from operator import add, lt
+
+from csr import CSR, FrozenRows, level_bfs, pack_rows, strongly_connected_components
+from graph_file import chunked, iter_edge_file, read_graph, write_graph
+from instrumentation import GraphStats, timed_method
+from query_cache import MISSING, QueryCache, cached_method
+
+
+class CycleError(ValueError):
+    """
+    Raised by DirectedGraph.topological_sort() when the graph has a cycle. cycle holds the vertices of one cycle in
+    the format returned by find_cycle().
+    """
+
+    def __init__(self, cycle: []):
+        super().__init__(f'graph has a cycle: {cycle}')
+        self.cycle = cycle
+
+
+class _MatrixRow:
+    """
+    View of a single adjacency matrix row, so adj_matrix[u][v] keeps working for every storage backend. Rows taken
+    from a graph write through its add_edge() / remove_edge(), so its cached results stay up to date; other rows are
+    read-only.
+    """
+
+    def __init__(self, matrix, u: int, graph=None):
+        self._matrix = matrix
+        self._u = u
+        self._graph = graph
+
+    def _index(self, v: int) -> int:
+        """
+        Helper function which normalizes a column index the same way a list would
+        """
+        n = len(self._matrix)
+        if v < 0:
+            v += n
+        if not 0 <= v < n:
+            raise IndexError('adjacency matrix column out of range')
+        return v
+
+    def __len__(self):
+        return len(self._matrix)
+
+    def __iter__(self):
+        get = self._matrix.get
+        return (get(self._u, v) for v in range(len(self._matrix)))
+
+    def __getitem__(self, v: int):
+        return self._matrix.get(self._u, self._index(v))
+
+    def __setitem__(self, v: int, weight) -> None:
+        if self._graph is None:
+            raise TypeError('adjacency matrix row is read-only')
+        v = self._index(v)
+        if weight == 0:
+            self._graph.remove_edge(self._u, v)
+        else:
+            self._graph.add_edge(self._u, v, weight)
+
+
+class _AdjacencyMatrix:
+    """
+    View of a graph's adjacency matrix, returned by DirectedGraph.adj_matrix. Indexes like a list of lists, and
+    adj_matrix[u][v] = weight is the same as add_edge(u, v, weight), or remove_edge(u, v) for a weight of 0.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return len(self._graph._matrix)
+
+    def __getitem__(self, u: int):
+        matrix = self._graph._matrix
+        return _MatrixRow(matrix, matrix.row_index(u), self._graph)
+
+    def __iter__(self):
+        matrix = self._graph._matrix
+        return (_MatrixRow(matrix, u, self._graph) for u in range(len(matrix)))
+
+
+class _Matrix:
+    """
+    Base class for adjacency matrix storage backends
+    - a weight of 0 means there is no edge
+    - row(u) returns the non-zero entries of row u as ascending (vertex, weight) tuples
+    """
+
+    # (csr, transpose) pair cached by reverse_csr()
+    _reverse = None
+
+    def __init__(self, rows=()):
+        """
+        Initialize the backend from a dense list-of-lists matrix
+        """
+        self._n = 0
+        self.add_vertices(len(rows))
+        for u, row in enumerate(rows):
+            for v, weight in enumerate(row):
+                if weight != 0:
+                    self.set(u, v, weight)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, u: int):
+        return _MatrixRow(self, self.row_index(u))
+
+    def row_index(self, u: int) -> int:
+        """
+        Normalizes a row index the same way a list would
+        """
+        if u < 0:
+            u += self._n
+        if not 0 <= u < self._n:
+            raise IndexError('adjacency matrix row out of range')
+        return u
+
+    def __iter__(self):
+        return (_MatrixRow(self, u) for u in range(self._n))
+
+    @classmethod
+    def from_csr(cls, csr: CSR):
+        """
+        Returns a matrix holding the edges of csr
+        """
+        matrix = cls()
+        matrix.add_vertices(len(csr))
+        for u in range(len(csr)):
+            for v, weight in csr.row(u):
+                matrix.set(u, v, weight)
+        return matrix
+
+    def edges(self):
+        """
+        Yields every edge as a (src, dst, weight) tuple in row-major order
+        """
+        for u in range(self._n):
+            for v, weight in self.row(u):
+                yield u, v, weight
+
+    def update(self, rows: {}) -> None:
+        """
+        Sets many entries at once from a dict of {src: {dst: weight}}
+        """
+        for u, row in rows.items():
+            for v, weight in row.items():
+                self.set(u, v, weight)
+
+    def to_csr(self) -> CSR:
+        """
+        Returns a CSR snapshot of the matrix
+        """
+        return CSR.from_rows(self.row(u) for u in range(self._n))
+
+    def reverse_csr(self, csr=None) -> CSR:
+        """
+        Returns the transpose of to_csr(), or of csr if it was just returned by to_csr(), reused for as long as
+        to_csr() returns the same snapshot
+        """
+        if csr is None:
+            csr = self.to_csr()
+        if self._reverse is None or self._reverse[0] is not csr:
+            self._reverse = (csr, csr.transpose())
+        return self._reverse[1]
+
+
+# marks a dense matrix cell whose weight is kept in _DenseMatrix._wide
+_WIDE = -2 ** 63
+
+
+class _DenseMatrix(_Matrix):
+    """
+    Adjacency matrix stored as one flat typed array of capacity x capacity cells
+    - cell (u, v) lives at index u * capacity + v
+    - capacity grows by half when it runs out, so adding vertices is amortized O(1) row copies
+    - only the first len(self) rows and columns are part of the graph
+    - integer weights live in the array; any other weight (floats, integers beyond 64 bits) is kept as given in the
+      _wide dict under the cell index, with _WIDE in its cell, so every weight reads back with the type it was set with
+    """
+
+    def __init__(self, rows=()):
+        self._cap = 0
+        self._data = array('q')
+        self._wide = {}
+        super().__init__(rows)
+
+    def reserve(self, n: int) -> None:
+        """
+        Grows the capacity to at least n vertices, copying the existing rows into the new buffer
+        """
+        if n <= self._cap:
+            return
+        data = array('q', [0]) * (n * n)
+        for u in range(self._n):
+            data[u * n:u * n + self._n] = self._data[u * self._cap:u * self._cap + self._n]
+        if len(self._wide) != 0:
+            cap = self._cap
+            self._wide = {i // cap * n + i % cap: weight for i, weight in self._wide.items()}
+        self._cap = n
+        self._data = data
+
+    def add_vertices(self, k: int) -> None:
+        """
+        Adds k empty rows and columns
+        """
+        if self._n + k > self._cap:
+            self.reserve(max(self._n + k, self._cap + self._cap // 2, 8))
+        self._n += k
+
+    def get(self, u: int, v: int):
+        i = u * self._cap + v
+        weight = self._data[i]
+        return self._wide[i] if weight == _WIDE else weight
+
+    def set(self, u: int, v: int, weight) -> None:
+        i = u * self._cap + v
+        if weight == 0:
+            weight = 0
+        if type(weight) is int and _WIDE < weight < 2 ** 63:
+            if self._data[i] == _WIDE:
+                del self._wide[i]
+            self._data[i] = weight
+        else:
+            self._data[i] = _WIDE
+            self._wide[i] = weight
+
+    def row(self, u: int) -> []:
+        start = u * self._cap
+        cells = self._data[start:start + self._n]
+        if len(self._wide) == 0:
+            return [(v, weight) for v, weight in enumerate(cells) if weight != 0]
+        wide = self._wide
+        return [(v, wide[start + v] if weight == _WIDE else weight) for v, weight in enumerate(cells) if weight != 0]
+
+    def column(self, v: int) -> []:
+        """
+        Returns the edges into v as ascending (vertex, weight) tuples, read with one strided slice of the matrix
+        """
+        cells = self._data[v:self._n * self._cap:self._cap]
+        if len(self._wide) == 0:
+            return [(u, weight) for u, weight in enumerate(cells) if weight != 0]
+        wide, cap = self._wide, self._cap
+        return [(u, wide[u * cap + v] if weight == _WIDE else weight) for u, weight in enumerate(cells) if weight != 0]
+
+
+class _SparseMatrix(_Matrix):
+    """
+    Adjacency matrix stored as an immutable CSR base plus a mutable delta layer
+    - a row that has been written to is copied out of the CSR into a dict and shadows the base row
+    - the delta layer is folded back into the CSR once enough rows are dirty
+    - column(v) reads the transpose of the CSR plus a reverse index of the edges written since the last compaction
+    """
+
+    min_dirty_rows = 1024
+
+    def __init__(self, rows=()):
+        self._base = CSR()
+        self._dirty = {}
+        self._sorted = {}
+        self._incoming = {}
+        super().__init__(rows)
+
+    def reserve(self, n: int) -> None:
+        """
+        Sparse rows are allocated on demand, so there is nothing to reserve
+        """
+
+    def add_vertices(self, k: int) -> None:
+        """
+        Adds k empty rows and columns. Rows past the end of the CSR base are treated as empty.
+        """
+        self._n += k
+
+    def _base_row(self, u: int) -> []:
+        """
+        Helper function which returns row u of the CSR base, or an empty row if the base is shorter
+        """
+        if u < len(self._base):
+            return self._base.row(u)
+        return []
+
+    def get(self, u: int, v: int):
+        row = self._dirty.get(u)
+        if row is not None:
+            return row.get(v, 0)
+        if u < len(self._base):
+            return self._base.get(u, v)
+        return 0
+
+    def _dirty_row(self, u: int) -> {}:
+        """
+        Helper function which returns row u of the delta layer for writing, copying it out of the base if required
+        """
+        row = self._dirty.get(u)
+        if row is None:
+            row = self._dirty[u] = dict(self._base_row(u))
+        self._sorted.pop(u, None)
+        return row
+
+    def _maybe_compact(self) -> None:
+        """
+        Helper function which folds the delta layer into the base once enough rows are dirty
+        """
+        if len(self._dirty) > max(self.min_dirty_rows, len(self._base) // 4):
+            self.compact()
+
+    def set(self, u: int, v: int, weight) -> None:
+        if weight == 0 and self.get(u, v) == 0:
+            return
+        row = self._dirty_row(u)
+        if weight != 0:
+            row[v] = weight
+            self._incoming.setdefault(v, set()).add(u)
+        else:
+            row.pop(v, None)
+        self._maybe_compact()
+
+    def update(self, rows: {}) -> None:
+        for u, updates in rows.items():
+            row = self._dirty_row(u)
+            for v, weight in updates.items():
+                if weight != 0:
+                    row[v] = weight
+                    self._incoming.setdefault(v, set()).add(u)
+                else:
+                    row.pop(v, None)
+        self._maybe_compact()
+
+    def row(self, u: int) -> []:
+        row = self._dirty.get(u)
+        if row is None:
+            return self._base_row(u)
+        cached = self._sorted.get(u)
+        if cached is None:
+            cached = self._sorted[u] = sorted(row.items())
+        return cached
+
+    def column(self, v: int) -> []:
+        """
+        Returns the edges into v as ascending (vertex, weight) tuples. The candidates are the sources of v in the
+        transpose of the CSR base, built once per base, and in the reverse index of the delta layer; each one is
+        checked against its current row.
+        """
+        if self._reverse is None or self._reverse[0] is not self._base:
+            self._reverse = (self._base, self._base.transpose())
+        reverse = self._reverse[1]
+        if len(self._dirty) == 0:
+            return reverse.row(v) if v < len(reverse) else []
+        candidates = set(self._incoming.get(v, ()))
+        if v < len(reverse):
+            candidates.update(reverse.neighbors(v))
+        column = []
+        for u in sorted(candidates):
+            weight = self.get(u, v)
+            if weight != 0:
+                column.append((u, weight))
+        return column
+
+    def compact(self) -> None:
+        """
+        Folds the delta layer into a freshly built CSR base
+        """
+        self._base = CSR.from_rows(self.row(u) for u in range(self._n))
+        self._dirty.clear()
+        self._sorted.clear()
+        self._incoming.clear()
+
+    @classmethod
+    def from_csr(cls, csr: CSR):
+        """
+        Returns a sparse matrix using csr as its base without copying it
+        """
+        matrix = cls()
+        matrix._base = csr
+        matrix._n = len(csr)
+        return matrix
+
+    def to_csr(self) -> CSR:
+        """
+        Returns the CSR base, compacting first if it does not cover every row
+        """
+        if len(self._dirty) != 0 or len(self._base) != self._n:
+            self.compact()
+        return self._base
+
+
+STORAGE_BACKENDS = {'dense': _DenseMatrix, 'sparse': _SparseMatrix}
+
+
+class _ReachabilityIndex:
+    """
+    Class to implement a transitive closure index over the strongly connected components of a directed graph
+    - component[v] is the component of vertex v, numbered so every edge between components goes to a lower number
+    - closure[c] is a bitset (Python int) of the components reachable from component c, including c itself
+    - an inserted edge ORs its target's bitset into every component that reaches its source; the components it
+      joins into a cycle are not merged, the bitsets stay correct without it
+    - edge removals are not supported, the index is rebuilt instead
+    """
+
+    def __init__(self, csr: CSR):
+        component, count = strongly_connected_components(csr)
+        members = [[] for _ in range(count)]
+        for v in range(len(csr)):
+            members[component[v]].append(v)
+
+        # Tarjan's numbering means every component a component points to is already complete
+        closure = [0] * count
+        for c in range(count):
+            bits = 1 << c
+            for u in members[c]:
+                for v in csr.neighbors(u):
+                    bits |= closure[component[v]]
+            closure[c] = bits
+
+        self.component = component
+        self.closure = closure
+
+    def add_vertex(self) -> None:
+        """
+        Adds an isolated vertex in a new component
+        """
+        self.component.append(len(self.closure))
+        self.closure.append(1 << len(self.closure))
+
+    def add_edge(self, u: int, v: int) -> None:
+        """
+        Updates the closure after the edge u->v was inserted
+        """
+        a, b = self.component[u], self.component[v]
+        closure = self.closure
+        if closure[a] >> b & 1:
+            return
+        bit_a = 1 << a
+        reach_b = closure[b]
+        for c in range(len(closure)):
+            if closure[c] & bit_a:
+                closure[c] |= reach_b
+
+    def reachable(self, u: int, v: int) -> bool:
+        """
+        Returns True if there is a path from u to v
+        """
+        return self.closure[self.component[u]] >> self.component[v] & 1 == 1
+
+
+def _iter_dfs(row, v_start: int, max_depth=None, details=False):
+    """
+    Generator which runs the depth-first search of DirectedGraph.iter_dfs() from a valid vertex over the adjacency
+    function row(u) -> [(v, weight), ...]
+    """
+    visited = set()
+    dfs_stack = [(v_start, 0, None)]
+    while len(dfs_stack) != 0:
+        v, depth, parent = dfs_stack.pop()
+        if v in visited:
+            continue
+        visited.add(v)
+        yield (v, depth, parent) if details else v
+        if max_depth is None or depth < max_depth:
+            for vertex, _ in reversed(row(v)):
+                if vertex not in visited:
+                    dfs_stack.append((vertex, depth + 1, v))
+
+
+def _iter_bfs(row, v_start: int, max_depth=None, details=False):
+    """
+    Generator which runs the breadth-first search of DirectedGraph.iter_bfs() from a valid vertex over the
+    adjacency function row(u) -> [(v, weight), ...]
+    """
+    discovered = {v_start}
+    bfs_queue = deque([(v_start, 0, None)])
+    while len(bfs_queue) != 0:
+        v, depth, parent = bfs_queue.popleft()
+        yield (v, depth, parent) if details else v
+        if max_depth is None or depth < max_depth:
+            for vertex, _ in row(v):
+                if vertex not in discovered:
+                    discovered.add(vertex)
+                    bfs_queue.append((vertex, depth + 1, v))
+
+
+class _IndexedHeap:
+    """
+    Class to implement a binary min-heap of items with priorities
+    - each item appears at most once; the position of every item is indexed
+    - lowering the priority of a queued item moves it up in place instead of pushing a duplicate entry
+    """
+
+    def __init__(self):
+        self._items = []
+        self._pos = {}
+        self._priority = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, item, priority) -> bool:
+        """
+        Queues item with the given priority, or lowers the priority of an already queued item. Returns True if the
+        item was queued or its priority lowered, False if it was already queued with a lower or equal priority.
+        """
+        if item in self._pos:
+            if priority >= self._priority[item]:
+                return False
+            self._priority[item] = priority
+            self._sift_up(self._pos[item])
+            return True
+        self._priority[item] = priority
+        self._pos[item] = len(self._items)
+        self._items.append(item)
+        self._sift_up(len(self._items) - 1)
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the (priority, item) pair with the lowest priority
+        """
+        items = self._items
+        top = items[0]
+        last = items.pop()
+        del self._pos[top]
+        if len(items) != 0:
+            items[0] = last
+            self._pos[last] = 0
+            self._sift_down(0)
+        return self._priority.pop(top), top
+
+    def peek(self):
+        """
+        Returns the (priority, item) pair with the lowest priority without removing it
+        """
+        top = self._items[0]
+        return self._priority[top], top
+
+    def _sift_up(self, i: int) -> None:
+        items, pos, priority = self._items, self._pos, self._priority
+        item = items[i]
+        key = priority[item]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if priority[items[parent]] <= key:
+                break
+            items[i] = items[parent]
+            pos[items[i]] = i
+            i = parent
+        items[i] = item
+        pos[item] = i
+
+    def _sift_down(self, i: int) -> None:
+        items, pos, priority = self._items, self._pos, self._priority
+        n = len(items)
+        item = items[i]
+        key = priority[item]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and priority[items[child + 1]] < priority[items[child]]:
+                child += 1
+            if priority[items[child]] >= key:
+                break
+            items[i] = items[child]
+            pos[items[i]] = i
+            i = child
+        items[i] = item
+        pos[item] = i
+
+
+class _CountingHeap(_IndexedHeap):
+    """
+    Indexed heap that counts its pushes, decrease-keys and pops for the instrumentation stats. Items are never queued
+    twice, so there are no stale entries to pop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pushes = 0
+        self.decrease_keys = 0
+        self.pops = 0
+
+    def push(self, item, priority) -> bool:
+        queued = item in self._pos
+        if not super().push(item, priority):
+            return False
+        if queued:
+            self.decrease_keys += 1
+        else:
+            self.pushes += 1
+        return True
+
+    def pop(self):
+        self.pops += 1
+        return super().pop()
+
+
+def _dijkstra(row, src: int, targets=None, max_distance=None, heap=None) -> ({}, {}):
+    """
+    Runs dijkstra's algorithm from src over the adjacency function row(u) -> [(v, weight), ...]. Stops early once
+    every vertex in targets is settled, or once the next vertex is further than max_distance. Returns a dict of
+    settled vertices to their distance and a dict of vertices to their predecessor on the shortest path.
+    heap may be an empty _IndexedHeap to use instead of a new one.
+    """
+    settled = {}
+    parents = {src: None}
+    remaining = set(targets) if targets is not None else None
+    heap = _IndexedHeap() if heap is None else heap
+    heap.push(src, 0)
+    while len(heap) != 0:
+        d, v = heap.pop()
+        if max_distance is not None and d > max_distance:
+            break
+        settled[v] = d
+        if remaining is not None:
+            remaining.discard(v)
+            if len(remaining) == 0:
+                break
+        for vertex, weight in row(v):
+            if vertex not in settled and heap.push(vertex, d + weight):
+                parents[vertex] = v
+
+    return settled, parents
+
+
+def _tree_path(parents: {}, v) -> []:
+    """
+    Helper function which follows parents from v until it reaches None and returns the vertices visited
+    """
+    path = []
+    while v is not None:
+        path.append(v)
+        v = parents[v]
+    return path
+
+
+def _bidirectional_dijkstra(row, column, src: int, dst: int) -> ([], float):
+    """
+    Runs dijkstra's algorithm forward from src over row(u) and backward from dst over column(v), the edges into v,
+    always advancing the side whose next vertex is closer. Stops once the two closest unsettled vertices are
+    together at least as far apart as the best path found through a vertex reached from both sides. Returns the
+    path and its cost, or ([], inf) if dst can't be reached.
+    """
+    inf = float('inf')
+    sides = []
+    for start, edges in ((src, row), (dst, column)):
+        heap = _IndexedHeap()
+        heap.push(start, 0)
+        sides.append((edges, heap, {start: 0}, {start: None}, set()))
+
+    best, meet = inf, None
+    while len(sides[0][1]) != 0 and len(sides[1][1]) != 0:
+        forward_top, backward_top = sides[0][1].peek()[0], sides[1][1].peek()[0]
+        if forward_top + backward_top >= best:
+            break
+        edges, heap, distance, parents, settled = sides[0 if forward_top <= backward_top else 1]
+        other_distance = sides[1 if forward_top <= backward_top else 0][2]
+        d, u = heap.pop()
+        settled.add(u)
+        for v, weight in edges(u):
+            if v in settled:
+                continue
+            if d + weight < distance.get(v, inf):
+                distance[v] = d + weight
+                parents[v] = u
+                heap.push(v, d + weight)
+            if v in other_distance and distance[v] + other_distance[v] < best:
+                best, meet = distance[v] + other_distance[v], v
+
+    if meet is None:
+        return [], inf
+    return _tree_path(sides[0][3], meet)[::-1] + _tree_path(sides[1][3], sides[1][3][meet]), best
+
+
+def _astar(row, src: int, dst: int, heuristic) -> ([], float):
+    """
+    Runs A* from src to dst over row(u), ordering the search by the distance from src plus heuristic(v, dst). The
+    heuristic must never overestimate the remaining distance; vertices are reopened when a shorter path to them is
+    found, so it does not need to be consistent. Returns the path and its cost, or ([], inf) if dst can't be reached.
+    """
+    inf = float('inf')
+    distance = {src: 0}
+    parents = {src: None}
+    heap = _IndexedHeap()
+    heap.push(src, heuristic(src, dst))
+    while len(heap) != 0:
+        _, u = heap.pop()
+        if u == dst:
+            return _tree_path(parents, dst)[::-1], distance[dst]
+        for v, weight in row(u):
+            d = distance[u] + weight
+            if d < distance.get(v, inf):
+                distance[v] = d
+                parents[v] = u
+                heap.push(v, d + heuristic(v, dst))
+    return [], inf
+
+
+# adjacency shared with all_pairs_dijkstra() worker processes, set up once per worker
+_worker_csr = None
+
+
+def _all_pairs_worker_init(descriptor: tuple) -> None:
+    """
+    Process pool initializer which attaches the worker to the shared memory CSR snapshot
+    """
+    global _worker_csr
+    _worker_csr = CSR.attach_shared(descriptor)
+
+
+def _all_pairs_worker_run(src: int) -> []:
+    """
+    Process pool task which returns the dijkstra distance list from src over the shared CSR snapshot
+    """
+    _, csr = _worker_csr
+    return _distance_list(csr, src)
+
+
+def _parse_weight(text: str):
+    """
+    Helper function which parses an edge weight from an edge list, as an int when possible
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _next_hop_row(csr: CSR, src: int) -> ([], []):
+    """
+    Helper function which runs dijkstra from src over a CSR and returns the distance list and the list of the first
+    vertex after src on the shortest path to each vertex
+    """
+    settled, parents = _dijkstra(csr.row, src)
+    distances = [float('inf')] * len(csr)
+    next_hops = [None] * len(csr)
+    for v, d in settled.items():
+        distances[v] = d
+        if v != src:
+            next_hops[v] = v if parents[v] == src else next_hops[parents[v]]
+    return distances, next_hops
+
+
+def _distance_list(csr: CSR, src: int) -> []:
+    """
+    Helper function which runs dijkstra from src over a CSR and returns the distances as a list, "inf" for
+    unreachable vertices
+    """
+    distances = [float('inf')] * len(csr)
+    for v, d in _dijkstra(csr.row, src)[0].items():
+        distances[v] = d
+    return distances
 
 
 class DirectedGraph:
@@ -15,8 +773,37 @@ class DirectedGraph:
     - loops not allowed
     - only positive edge weights
     - vertex names are integers
+    - adjacency matrix storage is pluggable, see STORAGE_BACKENDS
+    - removed vertices stay behind as tombstones until compact() renumbers the remaining vertices
     """
 
+    storage = 'dense'
+    # edge density (edges / possible edges) above which all_pairs_shortest_paths() prefers Floyd-Warshall
+    floyd_warshall_density = 0.3
+    # cached cycle witness, see find_cycle(); None until computed
+    _cycle = None
+    # reachability index, see reachable(); None until computed and after edges are removed
+    _reachability = None
+    # query result cache, see enable_cache(); _version is bumped whenever the graph changes
+    _cache = None
+    _version = 0
+    # (version, matrix, csr, transpose) used by level_bfs(), rebuilt once the graph or its storage changes
+    _level_csrs = None
+    _CACHED_QUERIES = ('dfs', 'bfs', 'is_valid_path')
+    # instrumentation stats, see enable_stats()
+    _stats = None
+    _INSTRUMENTED = ('add_vertex', 'add_vertices', 'add_edge', 'add_edges', 'remove_edge', 'remove_vertex',
+                     'get_edges', 'is_valid_path', 'validate_paths', 'dfs', 'bfs', 'level_bfs', 'has_cycle',
+                     'find_cycle', 'reachable', 'topological_sort', 'dijkstra', 'shortest_path_tree', 'shortest_path',
+                     'all_pairs_dijkstra', 'all_pairs_shortest_paths')
+    # tombstones tolerated before remove_vertex() runs compact(), at least a quarter of the vertices
+    min_tombstones = 1024
+    # last snapshot returned by freeze() and the rows changed since, see freeze()
+    _snapshot = None
+    _snapshot_rows = None
+    # (version, {(src, dst): weight}) edge index used by validate_paths()
+    _edge_index = None
+
     def __init__(self, start_edges=None):
         """
         Store graph info as adjacency matrix
@@ -54,25 +841,171 @@ class DirectedGraph:
         return out
 
     # ------------------------------------------------------------------ #
+    @property
+    def adj_matrix(self):
+        """
+        View of the adjacency matrix. Supports adj_matrix[u][v] indexing like a list of lists; assigning
+        adj_matrix[u][v] = weight adds, updates or removes the edge through add_edge() / remove_edge().
+        """
+        return _AdjacencyMatrix(self)
+
+    @adj_matrix.setter
+    def adj_matrix(self, rows):
+        self._matrix = STORAGE_BACKENDS[self.storage](rows)
+        self._removed = set()
+        self._cycle = None
+        self._reachability = None
+        self._snapshot = None
+        self._invalidate_queries()
+
+    def set_storage(self, storage: str) -> None:
+        """
+        Moves the adjacency matrix to a different storage backend ('dense' or 'sparse')
+        """
+        rows = STORAGE_BACKENDS[storage]()
+        rows.add_vertices(self.v_count)
+        for u, v, weight in self._matrix.edges():
+            rows.set(u, v, weight)
+        self.storage = storage
+        self._matrix = rows
+
+    def save(self, path) -> None:
+        """
+        Writes the graph to a binary graph file, see graph_file.py. Removed vertices are stored as tombstones, so the
+        other vertices keep their numbers when the graph is loaded.
+        """
+        write_graph(path, 'd', self._matrix.to_csr(), removed=self._removed)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Reads a graph written by save(). The graph uses sparse storage over the file's CSR arrays; with mmap they are
+        memory mapped and paged in on demand, otherwise they are read into memory. Edits are kept in the sparse
+        delta layer, the file itself is never modified.
+        """
+        kind, csr, removed, _ = read_graph(path, use_mmap=mmap)
+        if kind != 'd':
+            raise ValueError(f'{path} does not hold a directed graph')
+        graph = cls()
+        graph.storage = 'sparse'
+        graph._matrix = _SparseMatrix.from_csr(csr)
+        graph.v_count = len(csr)
+        graph._removed = set(removed)
+        return graph
+
+    def enable_cache(self, maxsize=1024) -> QueryCache:
+        """
+        Turns on an LRU cache of up to maxsize dfs(), bfs(), is_valid_path() and full dijkstra() /
+        shortest_path_tree() results and returns it; its hits and misses attributes count lookups. Cached results
+        are never served after the graph changes, except shortest path trees, which are only dropped when a changed
+        edge can affect them.
+        """
+        self._cache = QueryCache(maxsize)
+        self._install_wrappers()
+        return self._cache
+
+    def disable_cache(self) -> None:
+        """
+        Turns off the query result cache and drops its entries
+        """
+        self._cache = None
+        self._install_wrappers()
+
+    def enable_stats(self, sink=None) -> GraphStats:
+        """
+        Turns on instrumentation and returns the GraphStats collecting it: call counts and latency histograms for
+        the public methods, and algorithm counters such as the vertices settled and heap operations of dijkstra()
+        and the frontier sizes of bfs(). sink, if provided, is called with an event dict for every call and counter
+        report. Without instrumentation the methods run unwrapped.
+        """
+        self._stats = GraphStats()
+        if sink is not None:
+            self._stats.add_sink(sink)
+        self._install_wrappers()
+        return self._stats
+
+    def disable_stats(self) -> None:
+        """
+        Turns off instrumentation
+        """
+        self._stats = None
+        self._install_wrappers()
+
+    def _install_wrappers(self) -> None:
+        """
+        Helper function which rebuilds the per-instance method wrappers of the query cache and the instrumentation.
+        Methods neither one is enabled for are looked up on the class again.
+        """
+        for name in self._CACHED_QUERIES + self._INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        if self._cache is not None:
+            for name in self._CACHED_QUERIES:
+                setattr(self, name, cached_method(self, self._cache, name))
+        if self._stats is not None:
+            for name in self._INSTRUMENTED:
+                setattr(self, name, timed_method(self, self._stats, name))
+
+    def _invalidate_queries(self) -> None:
+        """
+        Helper function which marks every cached query result as stale
+        """
+        self._version += 1
+        if self._cache is not None:
+            self._cache.clear()
+
     def _valid_vertex(self, vertex):
         """
         Helper function which returns True if a vertex is valid, otherwise False.
         """
-        if 0 <= vertex < self.v_count:
+        if 0 <= vertex < self.v_count and vertex not in self._removed:
             return True
         else:
             return False
 
+    def freeze(self) -> 'FrozenDirectedGraph':
+        """
+        Returns an immutable, read-optimized snapshot of the graph, see FrozenDirectedGraph. Consecutive snapshots
+        share the blocks of rows that did not change in between, so after a few edits freezing again only copies
+        the changed rows. Freezing an unchanged graph returns the previous snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+        if snapshot is None:
+            rows = FrozenRows.from_rows(self._matrix.row, self.v_count)
+            removed = frozenset(self._removed)
+        else:
+            rows = snapshot._rows.replace(self._matrix.row, self._snapshot_rows, self.v_count)
+            # tombstones only accumulate until compact(), which drops the snapshot
+            removed = snapshot._removed
+            if len(removed) != len(self._removed):
+                removed = frozenset(self._removed)
+        self._snapshot = FrozenDirectedGraph(rows, removed, self._version)
+        self._snapshot_rows = set()
+        return self._snapshot
+
+    def reserve(self, n: int) -> None:
+        """
+        Preallocates storage for at least n vertices so later add_vertex calls do not have to grow the matrix.
+        """
+        self._matrix.reserve(n)
+
     def add_vertex(self) -> int:
         """
         Adds a new vertex to the graph and returns the number of vertices in the graph.
         """
-        self.v_count += 1
-        while len(self.adj_matrix) < self.v_count:
-            self.adj_matrix.append([])
-            for i in range(len(self.adj_matrix)):
-                while len(self.adj_matrix[i]) < self.v_count:
-                    self.adj_matrix[i].append(0)
+        return self.add_vertices(1)
+
+    def add_vertices(self, k: int) -> int:
+        """
+        Adds k new vertices to the graph and returns the number of vertices in the graph.
+        """
+        self.v_count += k
+        self._matrix.add_vertices(k)
+        self._invalidate_queries()
+        if self._reachability is not None:
+            for _ in range(k):
+                self._reachability.add_vertex()
 
         return self.v_count
 
@@ -87,9 +1020,47 @@ class DirectedGraph:
         if weight < 0 or src == dst:
             return
 
-        self.adj_matrix[src][dst] = weight
+        old = self._matrix.get(src, dst)
+        self._matrix.set(src, dst, weight)
+        self._edge_changed(src, dst, old, weight)
 
+    def add_edges(self, edges, chunk_size=100000) -> None:
+        """
+        Adds every (src, dst) or (src, dst, weight) edge from an iterable, following the same rules as add_edge().
+        The iterable is consumed chunk_size edges at a time; within a chunk, repeated edges are collapsed (the last
+        weight wins) and invalid edges are dropped before the matrix is updated once per chunk.
+        """
+        for chunk in chunked(edges, chunk_size):
+            rows = {}
+            for edge in chunk:
+                src, dst = edge[0], edge[1]
+                weight = edge[2] if len(edge) > 2 else 1
+                if self._valid_vertex(src) and self._valid_vertex(dst) and src != dst and weight >= 0:
+                    rows.setdefault(src, {})[dst] = weight
+            self._matrix.update(rows)
+            if self._snapshot is not None:
+                self._snapshot_rows.update(rows)
+        self._cycle = None
+        self._reachability = None
+        self._invalidate_queries()
 
+    @classmethod
+    def from_edge_file(cls, path, chunk_size=100000, storage=None):
+        """
+        Builds a graph from a text edge list with one "src dst [weight]" edge per line, see iter_edge_file(). Like
+        the start_edges constructor argument, vertices are created up to the largest vertex seen. The file is read
+        chunk_size lines at a time. storage selects the storage backend, the class default if not provided.
+        """
+        graph = cls()
+        if storage is not None:
+            graph.set_storage(storage)
+        for chunk in chunked(iter_edge_file(path), chunk_size):
+            edges = [(int(f[0]), int(f[1]), _parse_weight(f[2]) if len(f) > 2 else 1) for f in chunk]
+            v_count = max(max(0, u, v) for u, v, _ in edges) + 1
+            if v_count > graph.v_count:
+                graph.add_vertices(v_count - graph.v_count)
+            graph.add_edges(edges, chunk_size)
+        return graph
 
     def remove_edge(self, src: int, dst: int) -> None:
         """
@@ -99,32 +1070,83 @@ class DirectedGraph:
             if not self._valid_vertex(entry):
                 return
 
-        self.adj_matrix[src][dst] = 0
+        old = self._matrix.get(src, dst)
+        self._matrix.set(src, dst, 0)
+        self._edge_changed(src, dst, old, 0)
 
+    def remove_vertex(self, v: int):
+        """
+        Removes a vertex and every edge into or out of it in O(V) for dense storage and O(deg) plus a one-off
+        transpose for sparse storage. The vertex is left as a tombstone so the other vertices keep their numbers.
+        Once there are more than max(min_tombstones, V / 4) tombstones, compact() runs and its {old: new} vertex map
+        is returned; otherwise returns None.
+        """
+        if not self._valid_vertex(v):
+            return None
 
-    def get_vertices(self) -> []:
+        for dst, weight in list(self._matrix.row(v)):
+            self._matrix.set(v, dst, 0)
+            self._edge_changed(v, dst, weight, 0)
+        for src, weight in self._matrix.column(v):
+            self._matrix.set(src, v, 0)
+            self._edge_changed(src, v, weight, 0)
+
+        self._removed.add(v)
+        self._invalidate_queries()
+        if len(self._removed) > max(self.min_tombstones, self.v_count // 4):
+            return self.compact()
+        return None
+
+    def compact(self) -> {}:
         """
-        Returns a list of vertices in the graph
+        Drops the tombstones left by remove_vertex() and renumbers the remaining vertices 0..n-1 in their current
+        order. Returns a dict mapping each remaining vertex's old number to its new one.
         """
-        vertex_list = []
+        remap = {}
+        for v in range(self.v_count):
+            if v not in self._removed:
+                remap[v] = len(remap)
 
-        for v in range(len(self.adj_matrix)):
-            vertex_list.append(v)
+        rows = ([(remap[v], weight) for v, weight in self._matrix.row(u)] for u in remap)
+        if self.storage == 'sparse':
+            self._matrix = _SparseMatrix.from_csr(CSR.from_rows(rows))
+        else:
+            # set every cell directly rather than through a CSR, which would turn integer weights into floats
+            matrix = STORAGE_BACKENDS[self.storage]()
+            matrix.add_vertices(len(remap))
+            for u, row in enumerate(rows):
+                for v, weight in row:
+                    matrix.set(u, v, weight)
+            self._matrix = matrix
+        self.v_count = len(remap)
+        self._removed = set()
+        self._reachability = None
+        self._snapshot = None
+        self._invalidate_queries()
+        if self._cycle:
+            self._cycle = [remap[v] for v in self._cycle]
+        return remap
 
-        return vertex_list
+    def get_vertices(self) -> []:
+        """
+        Returns a list of vertices in the graph
+        """
+        if len(self._removed) != 0:
+            return [v for v in range(self.v_count) if v not in self._removed]
+        return list(range(self.v_count))
 
     def get_edges(self) -> []:
         """
         Returns a list of edges as a tuple of incident vertices and weight of their connecting edge.
         """
-        edge_list = []
+        return list(self._matrix.edges())
 
-        for i in range(len(self.adj_matrix)):
-            for j in range(len(self.adj_matrix[i])):
-                if self.adj_matrix[i][j] != 0:
-                    edge_list.append((i, j, self.adj_matrix[i][j]))
-
-        return edge_list
+    def iter_edges(self):
+        """
+        Generator yielding the same (src, dst, weight) tuples as get_edges() one at a time. Sparse storage only visits
+        stored edges, dense storage scans each row of cells. The graph must not be modified while iterating.
+        """
+        return self._matrix.edges()
 
     def is_valid_path(self, path: []) -> bool:
         """
@@ -132,7 +1154,7 @@ class DirectedGraph:
         """
         if not path:
             return True
-        elif len(path) == 1 and 0 <= path[0] < self.v_count:
+        elif len(path) == 1 and self._valid_vertex(path[0]):
             return True
         else:
             src, dest = 0, 1
@@ -143,26 +1165,46 @@ class DirectedGraph:
                 dest += 1
         return True
 
+    def validate_paths(self, paths, offsets=None, weights=False):
+        """
+        Checks a batch of paths at once and returns a list holding is_valid_path() of each one. paths is a list of
+        paths, or a flat sequence of vertices when offsets is provided, with path i being
+        paths[offsets[i]:offsets[i + 1]] like a CSR row. Every consecutive pair of the batch is looked up in a single
+        pass over a hashed {(src, dst): weight} edge index, which is kept until the graph changes. A pair with a
+        vertex outside the graph makes its path invalid instead of raising IndexError. With weights, returns a tuple
+        of that list and a list of the total weight of each path, 0 for empty and single-vertex paths and inf for
+        invalid ones.
+        """
+        if offsets is None:
+            paths, offsets = pack_rows(paths)
+        if self._edge_index is None or self._edge_index[0] != self._version:
+            self._edge_index = (self._version, {(u, v): weight for u, v, weight in self._matrix.edges()})
+        found = list(map(self._edge_index[1].get, zip(paths, islice(paths, 1, None)), repeat(0)))
+
+        valid = []
+        totals = []
+        for start, end in zip(offsets, islice(offsets, 1, None)):
+            # pairs that straddle two paths are looked up too, but only found[start:end - 1] belongs to this one
+            steps = found[start:end - 1] if end - start > 1 else []
+            valid.append(0 not in steps)
+            if weights:
+                totals.append(sum(steps) if valid[-1] else float('inf'))
+
+        if weights:
+            return valid, totals
+        return valid
+
     def dfs(self, v_start, v_end=None) -> []:
         """
         Performs a depth-first search of the graph and returns a list of vertices in the order they were visited.
         If the starting vertex is not a valid vertex, returns an empty list. Accepts an optional end vertex parameter,
         if provided, search will conclude when it explores the end vertex.
         """
-        if not self._valid_vertex(v_start):
-            return []
-
         visited_vertices = []
-        dfs_stack = [v_start]
-        while len(dfs_stack) != 0:
-            v = dfs_stack.pop()
-            if v not in visited_vertices:
-                visited_vertices.append(v)
-                for vertex in range(len(self.adj_matrix[v]) - 1, -1, -1):
-                    if self.adj_matrix[v][vertex] != 0:
-                        dfs_stack.append(vertex)
+        for v in self.iter_dfs(v_start):
+            visited_vertices.append(v)
             if v == v_end:
-                return visited_vertices
+                break
 
         return visited_vertices
 
@@ -172,75 +1214,607 @@ class DirectedGraph:
         If the starting vertex is not a valid vertex, returns an empty list. Accepts an optional end vertex parameter,
         if provided, search will conclude when it explores the end vertex.
         """
-        if not self._valid_vertex(v_start):
-            return []
+        if self._stats is not None:
+            return self._counted_bfs(v_start, v_end)
+
+        visited_vertices = []
+        for v in self.iter_bfs(v_start):
+            visited_vertices.append(v)
+            if v == v_end:
+                break
 
+        return visited_vertices
+
+    def _counted_bfs(self, v_start, v_end) -> []:
+        """
+        Helper function which runs bfs() while counting the vertices found at each depth, and reports the frontier
+        sizes to the instrumentation stats
+        """
         visited_vertices = []
-        bfs_queue = deque()
-        bfs_queue.append(v_start)
-        while len(bfs_queue) != 0:
-            v = bfs_queue.popleft()
-            if v not in visited_vertices:
-                visited_vertices.append(v)
-                for vertex in range(len(self.adj_matrix[v])):
-                    if self.adj_matrix[v][vertex] != 0 and vertex not in self.adj_matrix:
-                        bfs_queue.append(vertex)
+        frontier_sizes = []
+        for v, depth, _ in self.iter_bfs(v_start, details=True):
+            visited_vertices.append(v)
+            if depth == len(frontier_sizes):
+                frontier_sizes.append(0)
+            frontier_sizes[depth] += 1
             if v == v_end:
-                return visited_vertices
+                break
 
+        counters = {'vertices_visited': len(visited_vertices), 'levels': len(frontier_sizes),
+                    'max_frontier': max(frontier_sizes, default=0)}
+        self._stats.count('bfs', counters, frontier_sizes=frontier_sizes)
         return visited_vertices
 
+    def iter_dfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator which performs a depth-first search of the graph lazily, yielding vertices in the order dfs()
+        visits them. With details, yields (vertex, depth, parent) tuples instead, where parent is None for the
+        starting vertex. Accepts an optional maximum depth, vertices further from the start are not explored.
+        The search stops as soon as the caller stops iterating.
+        """
+        if not self._valid_vertex(v_start):
+            return
+
+        yield from _iter_dfs(self._matrix.row, v_start, max_depth, details)
+
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator which performs a breadth-first search of the graph lazily, yielding vertices in the order bfs()
+        visits them. With details, yields (vertex, depth, parent) tuples instead, where parent is None for the
+        starting vertex. Accepts an optional maximum depth, vertices further from the start are not explored.
+        The search stops as soon as the caller stops iterating.
+        """
+        if not self._valid_vertex(v_start):
+            return
+
+        yield from _iter_bfs(self._matrix.row, v_start, max_depth, details)
+
+    def level_bfs(self, v_start, workers=None) -> ([], [], []):
+        """
+        Performs a level-synchronous, direction-optimizing breadth-first search over a CSR snapshot of the graph,
+        see csr.level_bfs(). Returns a tuple of the visit order, a list of hop distances from the starting vertex
+        and a list of BFS tree parents, with None for vertices that were not reached. Accepts an optional number of
+        worker processes to expand large frontiers with. If the starting vertex is not valid, returns empty lists.
+        """
+        if not self._valid_vertex(v_start):
+            return [], [], []
+
+        cached = self._level_csrs
+        if cached is None or cached[0] != self._version or cached[1] is not self._matrix:
+            csr = self._matrix.to_csr()
+            cached = self._level_csrs = (self._version, self._matrix, csr, self._matrix.reverse_csr(csr))
+        order, distance, parent = level_bfs(cached[2], v_start, cached[3], workers)
+        return order, [d if d >= 0 else None for d in distance], [p if p >= 0 else None for p in parent]
+
+    def reachable(self, u: int, v: int) -> bool:
+        """
+        Returns True if there is a path from u to v (every vertex reaches itself), otherwise False. Answers come
+        from a transitive closure index over the strongly connected components, built on first use and updated as
+        edges are added; removing an edge drops the index until the next query.
+        """
+        if not self._valid_vertex(u) or not self._valid_vertex(v):
+            return False
+        if self._reachability is None:
+            self._reachability = _ReachabilityIndex(self._matrix.to_csr())
+        return self._reachability.reachable(u, v)
+
+    def strongly_connected_components(self) -> []:
+        """
+        Returns the strongly connected components as lists of vertices in ascending order. Uses an iterative Tarjan
+        over the CSR adjacency, see csr.strongly_connected_components(), so there is no recursion limit. Components
+        are listed in reverse topological order: an edge between two components always points to an earlier one.
+        """
+        component, count = strongly_connected_components(self._matrix.to_csr())
+        components = [[] for _ in range(count)]
+        for v in range(self.v_count):
+            components[component[v]].append(v)
+        if len(self._removed) != 0:
+            components = [c for c in components if c[0] not in self._removed]
+        return components
+
+    def condensation(self) -> ([], 'DirectedGraph'):
+        """
+        Returns a tuple of the strongly connected components, as listed by strongly_connected_components(), and the
+        condensation DAG: a graph with sparse storage where vertex c stands for components[c] and there is an edge
+        c->d if any vertex of c has an edge to a vertex of d, weighted with the smallest such edge weight.
+        """
+        components = self.strongly_connected_components()
+        component = {}
+        for c, members in enumerate(components):
+            for v in members:
+                component[v] = c
+
+        rows = []
+        for members in components:
+            row = {}
+            for u in members:
+                for v, weight in self._matrix.row(u):
+                    d = component[v]
+                    if d != component[u] and (d not in row or weight < row[d]):
+                        row[d] = weight
+            rows.append(sorted(row.items()))
+
+        dag = DirectedGraph()
+        dag.storage = 'sparse'
+        dag._matrix = _SparseMatrix.from_csr(CSR.from_rows(rows))
+        dag.v_count = len(components)
+        return components, dag
+
+    def topological_sort(self) -> []:
+        """
+        Returns the vertices in an order where every edge goes from an earlier vertex to a later one, in
+        O(E + V log V) using Kahn's algorithm on the CSR adjacency. Ties are broken by vertex number: of the vertices
+        whose incoming edges have all been placed, the smallest comes next, so the result is the lexicographically
+        smallest topological order. Raises CycleError with a cycle witness if the graph is not acyclic.
+        """
+        csr = self._matrix.to_csr()
+        n = self.v_count
+        in_degree = array('q', bytes(8 * n))
+        for v in csr.targets:
+            in_degree[v] += 1
+
+        ready = [v for v in range(n) if in_degree[v] == 0 and v not in self._removed]
+        order = []
+        while len(ready) != 0:
+            u = heapq.heappop(ready)
+            order.append(u)
+            for v in csr.neighbors(u):
+                in_degree[v] -= 1
+                if in_degree[v] == 0:
+                    heapq.heappush(ready, v)
+
+        if len(order) != n - len(self._removed):
+            raise CycleError(self.find_cycle())
+        return order
+
     def has_cycle(self):
         """
         If a graph contains at least one cycle, returns True, otherwise False.
         """
-        for v in range(len(self.adj_matrix)):
-            base_node = v
-            visited_vertices = []
-            dfs_stack = [v]
-            par = v
-            while len(dfs_stack) != 0:
-                temp = par
-                par = v
-                v = dfs_stack.pop()
-                if v == par:
-                    par = temp
-                if len(visited_vertices) > 1 and v == base_node or base_node in dfs_stack:
-                    return True
-                elif v not in visited_vertices:
-                    visited_vertices.append(v)
-                    for vertex in range(len(self.adj_matrix[v]) - 1, -1, -1):
-                        if self.adj_matrix[v][vertex] != 0 and vertex not in dfs_stack:
-                            dfs_stack.append(vertex)
-
-        return False
-
-    def dijkstra(self, src: int) -> []:
+        return len(self.find_cycle()) != 0
+
+    def find_cycle(self) -> []:
+        """
+        Returns the vertices of a cycle in the graph [v0, v1, ..., vk], where each vertex has an edge to the next
+        and vk has an edge back to v0. Returns an empty list if the graph is acyclic. The result is cached and
+        kept up to date as edges are added and removed.
+        """
+        if self._cycle is None:
+            self._cycle = self._search_cycle()
+        return list(self._cycle)
+
+    def _search_cycle(self) -> []:
+        """
+        Helper function which colours the graph with a single iterative depth-first pass and returns the first
+        cycle found, or an empty list. Vertices on the current path are grey, finished vertices are black.
+        """
+        black = set()
+        for root in range(self.v_count):
+            if root in black:
+                continue
+            path = [root]
+            grey = {root: 0}
+            iterators = [iter(self._matrix.row(root))]
+            while len(iterators) != 0:
+                for vertex, _ in iterators[-1]:
+                    if vertex in grey:
+                        return path[grey[vertex]:]
+                    if vertex not in black:
+                        grey[vertex] = len(path)
+                        path.append(vertex)
+                        iterators.append(iter(self._matrix.row(vertex)))
+                        break
+                else:
+                    iterators.pop()
+                    black.add(path.pop())
+                    grey.popitem()
+        return []
+
+    def _find_path(self, src: int, dst: int):
+        """
+        Helper function which returns a list of vertices forming a path from src to dst, or None if dst can't be
+        reached from src
+        """
+        parents = {src: None}
+        dfs_stack = [src]
+        while len(dfs_stack) != 0:
+            v = dfs_stack.pop()
+            if v == dst:
+                path = []
+                while v is not None:
+                    path.append(v)
+                    v = parents[v]
+                return path[::-1]
+            for vertex, _ in self._matrix.row(v):
+                if vertex not in parents:
+                    parents[vertex] = v
+                    dfs_stack.append(vertex)
+        return None
+
+    def _edge_changed(self, src: int, dst: int, old, new) -> None:
+        """
+        Helper function which updates cached results after the weight of src->dst changed from old to new
+        """
+        if old == new:
+            return
+        self._version += 1
+        if self._cache is not None:
+            self._invalidate_trees(src, dst, old, new)
+        if self._snapshot is not None:
+            self._snapshot_rows.add(src)
+
+        reachability = self._reachability
+        if reachability is not None:
+            if old == 0 and new != 0:
+                reachability.add_edge(src, dst)
+            elif old != 0 and new == 0:
+                self._reachability = None
+
+        if self._cycle is None:
+            return
+        if old == 0 and new != 0:
+            # with the index up to date, src->dst closes a cycle exactly when dst can reach src
+            if len(self._cycle) == 0 and (reachability is None or reachability.reachable(dst, src)):
+                path = self._find_path(dst, src)
+                if path is not None:
+                    self._cycle = path
+        elif old != 0 and new == 0:
+            cycle = self._cycle
+            for i in range(len(cycle)):
+                if cycle[i] == src and cycle[(i + 1) % len(cycle)] == dst:
+                    self._cycle = None
+                    break
+
+    def _invalidate_trees(self, src: int, dst: int, old, new) -> None:
+        """
+        Helper function which drops the cached shortest path trees that the weight of src->dst changing from old to
+        new can affect. A tree stays valid when an edge it does not use gets heavier or is removed, and when an edge
+        is added or made lighter without giving dst a shorter path.
+        """
+        inf = float('inf')
+        old_weight, new_weight = old or inf, new or inf
+        for key, (distances, predecessors) in self._cache.pinned('shortest_path_tree'):
+            if new_weight > old_weight:
+                valid = predecessors[dst] != src
+            else:
+                valid = distances[src] == inf or distances[src] + new_weight > distances[dst]
+            if not valid:
+                self._cache.discard(key)
+
+    def dijkstra(self, src: int, targets=None, max_distance=None) -> []:
         """
         Uses dijkstra's algorithm to determine the shortest path from a source vertex to each other vertex in the
-        graph. If a vertex is unreachable, "inf" is displayed.
+        graph. If a vertex is unreachable, "inf" is displayed. Accepts an optional target vertex or collection of
+        target vertices, if provided, the search stops once all of them are settled. Accepts an optional maximum
+        distance, vertices further away than that are reported as "inf".
         """
         if not self._valid_vertex(src):
             return []
+
+        return self.shortest_path_tree(src, targets, max_distance)[0]
+
+    def shortest_path(self, src: int, dst: int, heuristic=None) -> ([], float):
+        """
+        Returns a tuple of the vertices on a shortest path from src to dst and the length of that path, or
+        ([], inf) if there is no path or either vertex is invalid. Runs a bidirectional dijkstra, forward along the
+        rows of the matrix and backward along its columns (the edges into each vertex). If heuristic is provided,
+        runs A* instead: heuristic(v, dst) estimates the distance from v to dst and must never overestimate it.
+        Both searches stop as soon as the path is known, so usually only a small part of the graph is explored.
+        """
+        if not self._valid_vertex(src) or not self._valid_vertex(dst):
+            return [], float('inf')
+        if src == dst:
+            return [src], 0
+        if heuristic is not None:
+            return _astar(self._matrix.row, src, dst, heuristic)
+        return _bidirectional_dijkstra(self._matrix.row, self._matrix.column, src, dst)
+
+    def shortest_path_tree(self, src: int, targets=None, max_distance=None) -> ([], []):
+        """
+        Runs dijkstra's algorithm like dijkstra() and returns a tuple of the distance list and a predecessor list,
+        where predecessors[v] is the vertex before v on the shortest path from src, or None for src and for vertices
+        that were not reached. Use tree_path() to rebuild a path from the predecessor list.
+        """
+        if not self._valid_vertex(src):
+            return [], []
+
+        full_tree = self._cache is not None and targets is None and max_distance is None
+        if full_tree:
+            result = self._cache.get(('shortest_path_tree', src), self._version)
+            if result is not MISSING:
+                return list(result[0]), list(result[1])
+
+        if isinstance(targets, int):
+            targets = [targets]
+        if self._stats is None:
+            settled, parents = _dijkstra(self._matrix.row, src, targets, max_distance)
         else:
-            visited_vertices = {}
-            nodes = [(0, src)]
-            while len(nodes) != 0:
-                d, v = heapq.heappop(nodes)
-                if v not in visited_vertices:
-                    visited_vertices[v] = d
-                    for vertex in range(len(self.adj_matrix[v])):
-                        if self.adj_matrix[v][vertex] != 0:
-                            d_i = d + self.adj_matrix[v][vertex]
-                            heapq.heappush(nodes, (d_i, vertex))
-            distances = []
-            for key in range(self.v_count):
-                if key not in visited_vertices:
-                    distances.append(float('inf'))
-                else:
-                    distances.append(visited_vertices[key])
+            settled, parents = self._counted_dijkstra(src, targets, max_distance)
+
+        distances = [float('inf')] * self.v_count
+        predecessors = [None] * self.v_count
+        for v, d in settled.items():
+            distances[v] = d
+            predecessors[v] = parents[v]
+
+        if full_tree:
+            # kept across versions, _invalidate_trees() drops it when an edge change affects it
+            self._cache.put(('shortest_path_tree', src), None, (distances, predecessors))
+            return list(distances), list(predecessors)
+        return distances, predecessors
+
+    def _counted_dijkstra(self, src: int, targets, max_distance) -> ({}, {}):
+        """
+        Helper function which runs _dijkstra() with a counting heap and adjacency function, and reports the number
+        of vertices settled, edges relaxed and heap operations to the instrumentation stats
+        """
+        matrix_row = self._matrix.row
+        edges_relaxed = 0
+
+        def row(u):
+            nonlocal edges_relaxed
+            edges = matrix_row(u)
+            edges_relaxed += len(edges)
+            return edges
+
+        heap = _CountingHeap()
+        settled, parents = _dijkstra(row, src, targets, max_distance, heap)
+        self._stats.count('dijkstra', {'vertices_settled': len(settled), 'edges_relaxed': edges_relaxed,
+                                       'heap_pushes': heap.pushes, 'heap_decrease_keys': heap.decrease_keys,
+                                       'heap_pops': heap.pops, 'stale_pops': 0})
+        return settled, parents
+
+    def all_pairs_dijkstra(self, sources=None, workers=None, out=None):
+        """
+        Runs dijkstra() from every vertex in sources (all vertices if not provided) and yields (source, distances)
+        tuples in the order of sources. Sources are spread over a pool of worker processes (os.cpu_count() if workers
+        isn't provided) which read the graph from one shared memory snapshot instead of receiving a copy each.
+        If out is provided, the distance list of the i-th source is stored in out[i] and out is returned instead.
+        Invalid sources get an empty distance list, like dijkstra() returns for them.
+        """
+        sources = self.get_vertices() if sources is None else list(sources)
+        valid = [self._valid_vertex(v) for v in sources]
+        computed = self._all_pairs_rows(list(compress(sources, valid)), workers)
+        rows = ((v, next(computed)[1] if ok else []) for v, ok in zip(sources, valid))
+        if out is None:
+            return rows
+        for i, (_, distances) in enumerate(rows):
+            out[i] = distances
+        return out
+
+    def all_pairs_shortest_paths(self, method='auto') -> ([], []):
+        """
+        Computes the shortest path between every pair of vertices and returns a tuple of a distance matrix and a
+        next-hop matrix, where next_hops[u][v] is the vertex after u on a shortest path to v (None if v == u or v is
+        unreachable). method is 'floyd-warshall', which works on a dense copy of the matrix, 'dijkstra', which runs
+        dijkstra from every vertex, or 'auto' to use Floyd-Warshall once the edge density reaches
+        floyd_warshall_density.
+        """
+        csr = self._matrix.to_csr()
+        if method == 'auto':
+            possible_edges = self.v_count * (self.v_count - 1)
+            dense = possible_edges != 0 and csr.num_edges() >= self.floyd_warshall_density * possible_edges
+            method = 'floyd-warshall' if dense else 'dijkstra'
+
+        if method == 'floyd-warshall':
+            return self._floyd_warshall()
+        elif method == 'dijkstra':
+            rows = [_next_hop_row(csr, src) for src in range(self.v_count)]
+            return [row[0] for row in rows], [row[1] for row in rows]
+        raise ValueError(f'unknown all pairs shortest path method {method!r}')
+
+    def _floyd_warshall(self) -> ([], []):
+        """
+        Helper function which runs Floyd-Warshall over a dense copy of the matrix, with "inf" in place of the 0 "no
+        edge" entries. Every relaxation step updates a whole row at once through map() so the per-cell work runs
+        in C; only the cells that improve are touched from Python.
+        """
+        n = self.v_count
+        inf = float('inf')
+        dist = []
+        next_hops = []
+        for u in range(n):
+            row = [inf] * n
+            hops = [None] * n
+            for v, weight in self._matrix.row(u):
+                row[v] = weight
+                hops[v] = v
+            row[u] = 0
+            dist.append(row)
+            next_hops.append(hops)
+
+        columns = range(n)
+        for k in range(n):
+            row_k = dist[k]
+            for i in range(n):
+                d_ik = dist[i][k]
+                if d_ik == inf or i == k:
+                    continue
+                row_i = dist[i]
+                candidates = list(map(add, repeat(d_ik), row_k))
+                hops_i = next_hops[i]
+                hop_ik = hops_i[k]
+                for j in compress(columns, map(lt, candidates, row_i)):
+                    row_i[j] = candidates[j]
+                    hops_i[j] = hop_ik
+
+        return dist, next_hops
+
+    def _all_pairs_rows(self, sources: [], workers=None):
+        """
+        Helper generator for all_pairs_dijkstra()
+        """
+        csr = self._matrix.to_csr()
+        workers = min(workers or os.cpu_count() or 1, len(sources))
+        if workers <= 1:
+            for src in sources:
+                yield src, _distance_list(csr, src)
+            return
+
+        shm, descriptor = csr.to_shared()
+        try:
+            with multiprocessing.Pool(workers, _all_pairs_worker_init, (descriptor,)) as pool:
+                chunk_size = max(1, len(sources) // (4 * workers))
+                rows = pool.imap(_all_pairs_worker_run, sources, chunk_size)
+                yield from zip(sources, rows)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def tree_path(predecessors: [], dst: int) -> []:
+        """
+        Returns the path ending at dst described by a predecessor list from shortest_path_tree(). The path starts at
+        the source vertex of the tree, an unreached dst gives a single-vertex path [dst].
+        """
+        path = [dst]
+        while predecessors[path[-1]] is not None:
+            path.append(predecessors[path[-1]])
+        return path[::-1]
+
+
+class FrozenDirectedGraph:
+    """
+    Class to implement an immutable snapshot of a DirectedGraph, returned by DirectedGraph.freeze()
+    - the adjacency is a FrozenRows table of CSR blocks, shared with the snapshots taken before and after it
+    - answers the read queries of DirectedGraph as the graph stood when it was frozen
+    - nothing is cached or written while reading, so a snapshot can be queried from many threads without locks
+    - version is the graph version the snapshot was taken at
+    """
+
+    __slots__ = ('_rows', '_removed', 'version')
+
+    def __init__(self, rows: FrozenRows, removed: frozenset, version: int):
+        self._rows = rows
+        self._removed = removed
+        self.version = version
+
+    @property
+    def v_count(self) -> int:
+        return len(self._rows)
+
+    tree_path = staticmethod(DirectedGraph.tree_path)
+
+    def _valid_vertex(self, vertex):
+        """
+        Helper function which returns True if a vertex is valid, otherwise False.
+        """
+        return 0 <= vertex < len(self._rows) and vertex not in self._removed
+
+    def get_vertices(self) -> []:
+        """
+        Returns a list of vertices in the snapshot
+        """
+        return [v for v in range(len(self._rows)) if v not in self._removed]
+
+    def get_edges(self) -> []:
+        """
+        Returns a list of (src, dst, weight) edges in row-major order
+        """
+        return list(self.iter_edges())
+
+    def iter_edges(self):
+        """
+        Generator yielding the same (src, dst, weight) tuples as get_edges() one at a time
+        """
+        for u in range(len(self._rows)):
+            for v, weight in self._rows.row(u):
+                yield u, v, weight
+
+    def is_valid_path(self, path: []) -> bool:
+        """
+        Returns True if each vertex of the path has an edge to the next one. An empty path and a single vertex are
+        valid, like DirectedGraph.is_valid_path().
+        """
+        for src, dst in zip(path, path[1:]):
+            if not self._valid_vertex(src) or self._rows.get(src, dst) == 0:
+                return False
+        return True
+
+    def dfs(self, v_start, v_end=None) -> []:
+        """
+        Returns the vertices visited by a depth-first search, see DirectedGraph.dfs()
+        """
+        visited_vertices = []
+        for v in self.iter_dfs(v_start):
+            visited_vertices.append(v)
+            if v == v_end:
+                break
+
+        return visited_vertices
+
+    def bfs(self, v_start, v_end=None) -> []:
+        """
+        Returns the vertices visited by a breadth-first search, see DirectedGraph.bfs()
+        """
+        visited_vertices = []
+        for v in self.iter_bfs(v_start):
+            visited_vertices.append(v)
+            if v == v_end:
+                break
+
+        return visited_vertices
+
+    def iter_dfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator which performs a depth-first search lazily, see DirectedGraph.iter_dfs()
+        """
+        if not self._valid_vertex(v_start):
+            return
+
+        yield from _iter_dfs(self._rows.row, v_start, max_depth, details)
+
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator which performs a breadth-first search lazily, see DirectedGraph.iter_bfs()
+        """
+        if not self._valid_vertex(v_start):
+            return
+
+        yield from _iter_bfs(self._rows.row, v_start, max_depth, details)
+
+    def dijkstra(self, src: int, targets=None, max_distance=None) -> []:
+        """
+        Returns the shortest distance from src to each vertex, see DirectedGraph.dijkstra()
+        """
+        if not self._valid_vertex(src):
+            return []
+
+        return self.shortest_path_tree(src, targets, max_distance)[0]
+
+    def shortest_path_tree(self, src: int, targets=None, max_distance=None) -> ([], []):
+        """
+        Returns a tuple of the distance list and the predecessor list, see DirectedGraph.shortest_path_tree()
+        """
+        if not self._valid_vertex(src):
+            return [], []
+
+        if isinstance(targets, int):
+            targets = [targets]
+        settled, parents = _dijkstra(self._rows.row, src, targets, max_distance)
+
+        distances = [float('inf')] * len(self._rows)
+        predecessors = [None] * len(self._rows)
+        for v, d in settled.items():
+            distances[v] = d
+            predecessors[v] = parents[v]
+        return distances, predecessors
+
+    def shortest_path(self, src: int, dst: int, heuristic=None) -> ([], float):
+        """
+        Returns a tuple of the vertices on a shortest path from src to dst and its length, or ([], inf), see
+        DirectedGraph.shortest_path(). Snapshots keep no reverse adjacency, so without a heuristic this runs a
+        one-sided dijkstra that stops once dst is settled.
+        """
+        if not self._valid_vertex(src) or not self._valid_vertex(dst):
+            return [], float('inf')
+        if heuristic is not None:
+            return _astar(self._rows.row, src, dst, heuristic)
+        settled, parents = _dijkstra(self._rows.row, src, [dst])
+        if dst not in settled:
+            return [], float('inf')
+        return _tree_path(parents, dst)[::-1], settled[dst]
 
-            return distances
 
 if __name__ == '__main__':
 
@@ -325,3 +1899,41 @@ if __name__ == '__main__':
     print('\n', g)
     for i in range(5):
         print(f'DIJKSTRA {i} {g.dijkstra(i)}')
+
+
+    print("\nsave() / load() round trip with mmap")
+    print("------------------------------------")
+    edges = [(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3),
+             (3, 1, 5), (2, 1, 23), (3, 2, 7)]
+    g = DirectedGraph(edges)
+    with tempfile.TemporaryDirectory() as directory:
+        first, second = os.path.join(directory, 'first.graph'), os.path.join(directory, 'second.graph')
+        g.save(first)
+        loaded = DirectedGraph.load(first)
+        loaded.save(second)
+        reloaded = DirectedGraph.load(second)
+        print(reloaded.get_edges() == g.get_edges(), reloaded.shortest_path(0, 2))
+        g.remove_vertex(3)
+        g.save(first)
+        loaded = DirectedGraph.load(first)
+        print(loaded.get_vertices(), loaded.get_edges() == g.get_edges())
+        del loaded, reloaded
+
+
+    print("\ncompact() with mixed integer and float weights")
+    print("----------------------------------------------")
+    g = DirectedGraph([(0, 1, 10), (1, 2, 2.5), (3, 0, 7)])
+    g.remove_vertex(3)
+    g.compact()
+    print(g.get_edges())
+    print(g)
+
+
+    print("\nenable_stats() records one call per dijkstra()")
+    print("----------------------------------------------")
+    g = DirectedGraph([(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3),
+                       (3, 1, 5), (2, 1, 23), (3, 2, 7)])
+    stats = g.enable_stats()
+    g.dijkstra(0)
+    g.has_cycle()
+    print(stats.calls)
@@ -0,0 +1,150 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Compact binary file format for graphs. A file holds a fixed header followed by CSR offsets, targets
+# and weights, plus a vertex name table for graphs with string vertex names. Files can be opened through a
+# memory map so the arrays are used in place and paged in on demand. Also reads plain text edge lists in chunks.
+#
+# Layout (little-endian, every section starts on an 8 byte boundary):
+#   header        magic, version, kind ('d' directed / 'u' undirected), weight typecode ('-' when unweighted),
+#                 removed vertices, rows, edges, name bytes
+#   offsets       int64 x (rows + 1)
+#   targets       int64 x edges
+#   weights       int64 or float64 x edges                 (weighted graphs only)
+#   removed       int64 x removed, tombstoned vertex ids    (directed graphs only)
+#   order         int64 x rows, vertex ids in insertion order (undirected graphs only)
+#   name offsets  int64 x (rows + 1), slices of the name blob (undirected graphs only)
+#   name blob     utf-8 encoded vertex names, id order      (undirected graphs only)
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import islice
+
+from csr import CSR
+
+MAGIC = b'GRAPHCSR'
+VERSION = 2
+# version 1 files have no removed section, and zero padding where the removed count is now stored
+_READ_VERSIONS = (1, 2)
+_HEADER = struct.Struct('<8sHccIqqq')
+
+
+def _write_array(file, data) -> None:
+    """
+    Helper function which writes the raw bytes of an array or memoryview
+    """
+    file.write(memoryview(data).cast('B'))
+
+
+def write_graph(path, kind: str, csr: CSR, order=None, names=None, removed=()) -> None:
+    """
+    Writes a graph file. kind is 'd' for a directed graph or 'u' for an undirected graph. Undirected graphs also
+    store the vertex insertion order and the vertex names, with names[i] being the name of vertex i. Directed graphs
+    also store the removed vertices, the tombstones that keep the other vertices' numbers.
+    """
+    if sys.byteorder != 'little':
+        raise OSError('graph files can only be written on little-endian hosts')
+
+    name_offsets = array('q', [0])
+    blob = bytearray()
+    if kind == 'u':
+        for name in names:
+            blob += name.encode('utf-8')
+            name_offsets.append(len(blob))
+
+    typecode = csr.weight_typecode() or '-'
+    removed = array('q', sorted(removed) if kind == 'd' else ())
+    header = _HEADER.pack(MAGIC, VERSION, kind.encode(), typecode.encode(), len(removed), len(csr), csr.num_edges(),
+                          len(blob))
+    # write next to the target and swap it in, so graphs still mapping an older copy of the file keep working
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        _write_array(file, csr.offsets)
+        _write_array(file, csr.targets)
+        if csr.weights is not None:
+            _write_array(file, csr.weights)
+        _write_array(file, removed)
+        if kind == 'u':
+            _write_array(file, array('q', order))
+            _write_array(file, name_offsets)
+            file.write(blob)
+    os.replace(temp_path, path)
+
+
+def read_graph(path, use_mmap=True) -> (str, CSR, [], []):
+    """
+    Reads a graph file and returns a tuple of (kind, csr, order, names). For directed graphs order is the list of
+    removed vertices instead and names is None. With use_mmap the CSR arrays are read-only views into a memory map
+    of the file, otherwise the file is read into memory.
+    """
+    if sys.byteorder != 'little':
+        raise OSError('graph files can only be read on little-endian hosts')
+
+    with open(path, 'rb') as file:
+        if use_mmap:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = file.read()
+
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise ValueError(f'{path} is not a graph file')
+    magic, version, kind, typecode, n_removed, n_rows, n_edges, n_name_bytes = _HEADER.unpack_from(view)
+    if magic != MAGIC or version not in _READ_VERSIONS:
+        raise ValueError(f'{path} is not a supported graph file, expected version {_READ_VERSIONS}')
+    kind, typecode = kind.decode(), typecode.decode()
+
+    pos = _HEADER.size
+
+    def section(count, code='q'):
+        nonlocal pos
+        part = view[pos:pos + 8 * count]
+        pos += 8 * count
+        if use_mmap:
+            return part.cast(code)
+        data = array(code)
+        data.frombytes(part)
+        return data
+
+    offsets = section(n_rows + 1)
+    targets = section(n_edges)
+    if typecode == '-':
+        csr = CSR(offsets, targets, weighted=False)
+    else:
+        csr = CSR(offsets, targets, section(n_edges, typecode))
+    if kind == 'd':
+        return kind, csr, list(section(n_removed)), None
+
+    order = section(n_rows)
+    name_offsets = section(n_rows + 1)
+    blob = view[pos:pos + n_name_bytes]
+    names = [str(blob[name_offsets[i]:name_offsets[i + 1]], 'utf-8') for i in range(n_rows)]
+    return kind, csr, order, names
+
+
+def chunked(iterable, chunk_size: int):
+    """
+    Yields lists of up to chunk_size consecutive items from iterable
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def iter_edge_file(path):
+    """
+    Yields the fields of each edge in a text edge list, one edge per line with fields separated by whitespace or
+    commas. Blank lines and lines starting with '#' are skipped.
+    """
+    with open(path) as file:
+        for line in file:
+            fields = line.replace(',', ' ').split()
+            if len(fields) != 0 and not fields[0].startswith('#'):
+                yield fields
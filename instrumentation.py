@@ -0,0 +1,119 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Opt-in instrumentation for the graph classes. An instrumented graph has its public methods wrapped on
+# the instance so every call is counted and timed, and its algorithms report counters such as edges relaxed. A graph
+# that is not instrumented runs the plain class methods, so it pays nothing.
+
+import threading
+import time
+
+# latency histogram buckets: bucket 0 counts calls under 1 microsecond, bucket i calls under 2 ** i microseconds, and
+# the last bucket everything slower
+LATENCY_BUCKETS = 24
+
+
+class GraphStats:
+    """
+    Class to implement the statistics collected from an instrumented graph
+    - calls[name] and seconds[name] are the call count and total run time of each instrumented method; a method
+      called by another instrumented method is not recorded separately, so each call is timed once
+    - latency[name] is a histogram of call durations, see LATENCY_BUCKETS
+    - counters[name] sums the algorithm counters reported by a method; counters named max_... keep the maximum
+    - every call and every counter report is also passed to each sink as an event dict
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.latency = {}
+        self.counters = {}
+        self.sinks = []
+        # per-thread flag set while an instrumented call is running, see timed_method()
+        self._active = threading.local()
+
+    def add_sink(self, sink) -> None:
+        """
+        Registers a callable that receives an event dict for every call ({'method', 'seconds'}) and counter report
+        ({'method', 'counters'}, plus any extra details such as 'frontier_sizes')
+        """
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink) -> None:
+        self.sinks.remove(sink)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Records one call of method name that took the given number of seconds
+        """
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = [0] * LATENCY_BUCKETS
+        histogram[min(LATENCY_BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+        for sink in self.sinks:
+            sink({'method': name, 'seconds': seconds})
+
+    def count(self, name: str, counters: {}, **details) -> None:
+        """
+        Adds the algorithm counters reported by one call of method name
+        """
+        totals = self.counters.setdefault(name, {})
+        for key, value in counters.items():
+            if key.startswith('max_'):
+                totals[key] = max(totals.get(key, value), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+        if len(self.sinks) != 0:
+            event = {'method': name, 'counters': dict(counters), **details}
+            for sink in self.sinks:
+                sink(event)
+
+    def snapshot(self) -> {}:
+        """
+        Returns a copy of the statistics as plain dicts and lists. latency_bounds_us lists the upper bound of each
+        latency bucket in microseconds, None for the last one.
+        """
+        return {
+            'calls': dict(self.calls),
+            'seconds': dict(self.seconds),
+            'latency': {name: list(histogram) for name, histogram in self.latency.items()},
+            'latency_bounds_us': [2 ** i for i in range(LATENCY_BUCKETS - 1)] + [None],
+            'counters': {name: dict(totals) for name, totals in self.counters.items()},
+        }
+
+    def reset(self) -> None:
+        """
+        Clears every statistic, keeping the sinks
+        """
+        self.calls.clear()
+        self.seconds.clear()
+        self.latency.clear()
+        self.counters.clear()
+
+
+def timed_method(graph, stats: GraphStats, name: str):
+    """
+    Returns a function that calls graph.name, as currently bound on the instance, and records the call in stats.
+    Calls made while another instrumented call of the same thread is running, such as the shortest_path_tree() call
+    inside dijkstra(), pass straight through, so only the outermost call is recorded.
+    """
+    method = getattr(graph, name)
+    clock = time.perf_counter
+    active = stats._active
+
+    def timed(*args, **kwargs):
+        if getattr(active, 'running', False):
+            return method(*args, **kwargs)
+        active.running = True
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            active.running = False
+            stats.record(name, clock() - start)
+
+    timed.__name__ = name
+    timed.__doc__ = method.__doc__
+    return timed
@@ -0,0 +1,123 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Least recently used cache for graph query results. Entries are tagged with the version of the graph
+# they were computed from, so a result is never served once the graph has changed, unless the graph chose to keep
+# it (see QueryCache.put()).
+
+from collections import OrderedDict
+
+# returned by QueryCache.get() when there is no usable entry
+MISSING = object()
+
+
+class QueryCache:
+    """
+    Class to implement a bounded LRU cache of query results
+    - entries are keyed by (query name, arguments...) tuples
+    - an entry is only returned while its version matches the version passed to get()
+    - entries stored with version None are kept across versions until the graph discards them
+    - hits and misses are counted
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple, version):
+        """
+        Returns the cached result for key, or MISSING if there is none for this version
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] is None or entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return MISSING
+
+    def put(self, key: tuple, version, result) -> None:
+        """
+        Stores a result computed at the given version, evicting the least recently used entries over maxsize.
+        A version of None keeps the entry until discard() or clear() is called.
+        """
+        self._entries[key] = (version, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pinned(self, name: str) -> []:
+        """
+        Returns a list of (key, result) tuples for the entries of query name that were stored with version None
+        """
+        return [(key, entry[1]) for key, entry in self._entries.items() if key[0] == name and entry[0] is None]
+
+    def discard(self, key: tuple) -> None:
+        """
+        Removes the entry for key, if any
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every entry, keeping the hit and miss counts
+        """
+        self._entries.clear()
+
+    def info(self) -> {}:
+        """
+        Returns a dict of the hit and miss counts, the number of entries and maxsize
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+def hashable_key(value):
+    """
+    Returns value with list, set and dict arguments turned into tuples and frozensets, so it can be part of a key
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable_key(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, hashable_key(item)) for key, item in value.items()))
+    return value
+
+
+def copy_result(result):
+    """
+    Returns a copy of the lists in a shared query result, so callers cannot modify the shared copy
+    """
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, tuple):
+        return tuple(copy_result(item) for item in result)
+    return result
+
+
+def cached_method(graph, cache: QueryCache, name: str):
+    """
+    Returns a function that calls the method name of graph through cache. Results are keyed by the method name and
+    arguments and tagged with graph._version, which the graph bumps whenever it changes.
+    """
+    method = getattr(type(graph), name).__get__(graph)
+
+    def cached(*args, **kwargs):
+        key = (name, hashable_key(args), hashable_key(kwargs))
+        version = graph._version
+        result = cache.get(key, version)
+        if result is MISSING:
+            result = method(*args, **kwargs)
+            cache.put(key, version, result)
+        return copy_result(result)
+
+    cached.__name__ = name
+    cached.__doc__ = method.__doc__
+    return cached
@@ -0,0 +1,921 @@
+# Course: CS 261
+# Author: Bryan Zierk
+# Assignment: Project 6 - Graph Implementation
+# Description: Sharded graphs for graphs too large for one process. Vertices are partitioned across worker processes,
+# by a stable hash or by a streaming partitioner that keeps neighbours together, and each shard process holds the
+# adjacency rows of its own vertices. BFS, reachability, connected components and dijkstra run as supersteps: the
+# coordinator sends one batch of messages to every shard over its pipe, the shards work in parallel and reply with
+# the messages for the next superstep. ShardedDirectedGraph and ShardedUndirectedGraph mirror the API of
+# DirectedGraph and UndirectedGraph.
+#
+# Example:
+#     with ShardedUndirectedGraph(['AB', 'BC'], shards=4, partition='locality') as graph:
+#         graph.bfs('A')
+
+import heapq
+import multiprocessing
+import weakref
+import zlib
+from collections import deque
+from itertools import chain, compress
+
+from graph_file import chunked
+
+PARTITIONS = ('hash', 'locality')
+
+
+def hash_partition(v, shards: int) -> int:
+    """
+    Returns the shard of vertex v under hash partitioning. The hash is stable across processes and runs, unlike
+    hash() of a string.
+    """
+    return zlib.crc32(repr(v).encode()) % shards
+
+
+class LocalityPartitioner:
+    """
+    Class to implement a streaming linear deterministic greedy (LDG) partitioner
+    - each vertex is placed once, on the shard holding most of its already placed neighbours, scaled by the room
+      left on that shard, so that few edges cross shards
+    - shards are kept within slack of the average size; a vertex with no placed neighbours goes to the smallest
+    - owner[v] is the shard of every placed vertex
+    """
+
+    def __init__(self, shards: int, slack=0.1):
+        self.shards = shards
+        self.slack = slack
+        self.owner = {}
+        self.sizes = [0] * shards
+
+    def place(self, v, neighbors=()) -> int:
+        """
+        Places vertex v given some of its neighbours, which do not need to be placed yet, and returns its shard
+        """
+        capacity = (len(self.owner) + 1) * (1 + self.slack) / self.shards + 1
+        counts = [0] * self.shards
+        for u in neighbors:
+            shard = self.owner.get(u)
+            if shard is not None:
+                counts[shard] += 1
+        sizes = self.sizes
+        shard = min(range(self.shards), key=lambda s: (-counts[s] * (1 - sizes[s] / capacity), sizes[s]))
+        self.owner[v] = shard
+        sizes[shard] += 1
+        return shard
+
+    def remove(self, v) -> None:
+        shard = self.owner.pop(v, None)
+        if shard is not None:
+            self.sizes[shard] -= 1
+
+
+_NO_EDGES = {}
+
+
+class _Shard:
+    """
+    Class to implement the state of one shard process
+    - rows[v] is the {neighbour: weight} row of every vertex the shard owns, with weight 1 for undirected graphs
+    - incoming[v] holds the owned vertices with an edge to v, so the edges into a removed vertex are found directly
+    - order[v] is the sequence number the coordinator gave v when it was first added, so vertices can be listed in
+      insertion order across shards
+    - state holds the per-vertex values of the superstep algorithm in progress, cleared by reset()
+    - an exception raised while handling a message without a reply is reported with the next reply
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.incoming = {}
+        self.order = {}
+        self.state = {}
+        self.targets = ()
+        self.error = None
+
+    def add_vertices(self, vertices, sequence=None) -> None:
+        """
+        Adds the vertices that are not there yet, numbering them with the aligned sequence numbers if provided
+        """
+        for v in vertices:
+            self.rows.setdefault(v, {})
+        if sequence is not None:
+            for v, number in zip(vertices, sequence):
+                self.order.setdefault(v, number)
+
+    def set_edges(self, edges) -> None:
+        """
+        Sets the weight of each (src, dst, weight) edge, removing the edge when the weight is 0
+        """
+        for u, v, weight in edges:
+            if weight != 0:
+                self.rows.setdefault(u, {})[v] = weight
+                self.incoming.setdefault(v, set()).add(u)
+            elif self.rows.get(u, _NO_EDGES).pop(v, None) is not None:
+                self.incoming[v].discard(u)
+
+    def remove_vertex(self, v):
+        """
+        Removes vertex v and its row. Returns its neighbours, or None if the shard does not own v.
+        """
+        row = self.rows.pop(v, None)
+        if row is None:
+            return None
+        self.order.pop(v, None)
+        for u in row:
+            self.incoming[u].discard(v)
+        return list(row)
+
+    def drop_edges_into(self, vertices) -> None:
+        for v in vertices:
+            for u in self.incoming.pop(v, ()):
+                self.rows[u].pop(v, None)
+
+    def has_vertices(self, vertices) -> []:
+        return [v in self.rows for v in vertices]
+
+    def rows_of(self, vertices) -> []:
+        """
+        Returns the row of each vertex as an ascending list of (neighbour, weight) tuples
+        """
+        rows = self.rows
+        return [sorted(rows.get(v, _NO_EDGES).items()) for v in vertices]
+
+    def weights(self, pairs) -> []:
+        """
+        Returns the weight of each (src, dst) edge, 0 where there is no edge
+        """
+        rows = self.rows
+        return [rows.get(u, _NO_EDGES).get(v, 0) for u, v in pairs]
+
+    def vertices(self) -> []:
+        return list(self.rows)
+
+    def ordered_vertices(self) -> []:
+        """
+        Returns a (sequence number, vertex) tuple for every owned vertex
+        """
+        order = self.order
+        return [(order.get(v, 0), v) for v in self.rows]
+
+    def ordered_rows(self) -> []:
+        """
+        Returns a (sequence number, vertex, ascending neighbours) tuple for every owned vertex
+        """
+        order = self.order
+        return [(order.get(v, 0), v, sorted(row)) for v, row in self.rows.items()]
+
+    def edges(self) -> []:
+        return [(u, v, weight) for u, row in self.rows.items() for v, weight in row.items()]
+
+    def stats(self) -> (int, int, int):
+        """
+        Returns the number of owned vertices, of edges leaving them and of those edges that lead to other shards
+        """
+        rows = self.rows
+        edges = sum(len(row) for row in rows.values())
+        cut = sum(1 for row in rows.values() for v in row if v not in rows)
+        return len(rows), edges, cut
+
+    # ------------------------------------------------------------------ #
+    def reset(self, targets=()) -> None:
+        """
+        Clears the superstep state, remembering the owned target vertices of the next dijkstra
+        """
+        self.state = {}
+        self.targets = targets
+
+    def visit(self, vertices) -> []:
+        """
+        BFS superstep: marks vertices as visited and returns True for each one that was not visited before
+        """
+        visited = self.state
+        fresh = []
+        for v in vertices:
+            fresh.append(v not in visited)
+            visited[v] = True
+        return fresh
+
+    def relax(self, messages, max_distance) -> ([], {}):
+        """
+        Dijkstra superstep: applies the (vertex, distance) messages, then runs dijkstra over the owned vertices from
+        the ones that got closer. Returns the (vertex, distance) messages for the vertices of other shards, one per
+        vertex, and the current distance of each owned target that has been reached.
+        """
+        inf = float('inf')
+        distance = self.state
+        rows = self.rows
+        heap = []
+        for v, d in messages:
+            if d < distance.get(v, inf):
+                distance[v] = d
+                heap.append((d, v))
+        heapq.heapify(heap)
+
+        outbox = {}
+        while len(heap) != 0:
+            d, v = heapq.heappop(heap)
+            if d > distance[v]:
+                continue
+            for u, weight in rows.get(v, _NO_EDGES).items():
+                du = d + weight
+                if max_distance is not None and du > max_distance:
+                    continue
+                if u not in rows:
+                    if du < outbox.get(u, inf):
+                        outbox[u] = du
+                elif du < distance.get(u, inf):
+                    distance[u] = du
+                    heapq.heappush(heap, (du, u))
+
+        return list(outbox.items()), {v: distance[v] for v in self.targets if v in distance}
+
+    def distances(self) -> []:
+        return list(self.state.items())
+
+    def propagate(self, messages) -> []:
+        """
+        Connected components superstep: applies the (vertex, label) messages, then spreads the smallest label
+        through the owned vertices. Returns the (vertex, label) messages for the neighbours on other shards, one per
+        vertex. Without messages, first labels every owned vertex with itself.
+        """
+        label = self.state
+        rows = self.rows
+        if messages is None:
+            for v in rows:
+                label[v] = v
+            queue = deque(rows)
+        else:
+            queue = deque()
+            for v, smallest in messages:
+                if smallest < label[v]:
+                    label[v] = smallest
+                    queue.append(v)
+
+        outbox = {}
+        while len(queue) != 0:
+            v = queue.popleft()
+            smallest = label[v]
+            for u in rows[v]:
+                if u not in rows:
+                    if u not in outbox or smallest < outbox[u]:
+                        outbox[u] = smallest
+                elif smallest < label[u]:
+                    label[u] = smallest
+                    queue.append(u)
+
+        return list(outbox.items())
+
+    def roots(self) -> int:
+        """
+        Returns the number of owned vertices that kept their own label, one per connected component
+        """
+        return sum(1 for v, smallest in self.state.items() if v == smallest)
+
+    def count_in_degrees(self) -> []:
+        """
+        Cycle check superstep: counts the in-degree of every owned vertex from the owned edges into it. Returns
+        (vertex, count) messages with the number of owned edges into each vertex of another shard.
+        """
+        rows = self.rows
+        in_degree = self.state = {v: 0 for v in rows}
+        outbox = {}
+        for row in rows.values():
+            for v in row:
+                if v in rows:
+                    in_degree[v] += 1
+                else:
+                    outbox[v] = outbox.get(v, 0) + 1
+        return list(outbox.items())
+
+    def peel(self, messages, sign: int) -> []:
+        """
+        Cycle check superstep: adds sign * count to the in-degree of each (vertex, count) message, then repeatedly
+        removes the owned vertices left with no incoming edges, as Kahn's algorithm does. Returns (vertex, count)
+        messages with the number of removed edges into each vertex of another shard. The vertices still in state
+        at the end lie on or behind a cycle.
+        """
+        rows = self.rows
+        in_degree = self.state
+        for v, count in messages:
+            if v in in_degree:
+                in_degree[v] += sign * count
+        if sign > 0:
+            queue = deque(v for v, degree in in_degree.items() if degree == 0)
+        else:
+            queue = deque({v for v, _ in messages if in_degree.get(v) == 0})
+        outbox = {}
+        while len(queue) != 0:
+            u = queue.popleft()
+            del in_degree[u]
+            for v in rows[u]:
+                if v not in rows:
+                    outbox[v] = outbox.get(v, 0) + 1
+                elif v in in_degree:
+                    in_degree[v] -= 1
+                    if in_degree[v] == 0:
+                        queue.append(v)
+        return list(outbox.items())
+
+    def remaining(self) -> int:
+        return len(self.state)
+
+
+def _shard_main(conn) -> None:
+    """
+    Runs a shard process: handles (method, args, reply) messages from the coordinator until it receives None.
+    Replies are (True, result) or (False, exception) tuples.
+    """
+    shard = _Shard()
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        name, args, reply = message
+        try:
+            result = getattr(shard, name)(*args)
+        except Exception as error:
+            if reply:
+                conn.send((False, error))
+            else:
+                shard.error = error
+            continue
+        if reply:
+            error, shard.error = shard.error, None
+            conn.send((True, result) if error is None else (False, error))
+    conn.close()
+
+
+def _shutdown(conns: [], processes: []) -> None:
+    """
+    Helper function which stops the shard processes of a sharded graph
+    """
+    for conn in conns:
+        try:
+            conn.send(None)
+            conn.close()
+        except OSError:
+            pass
+    for process in processes:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+
+class _ShardedGraph:
+    """
+    Base class for the coordinator of a sharded graph
+    - one worker process per shard, reached over a pipe; messages are (method, args, reply) tuples run on its _Shard
+    - _owner(v) is the shard of vertex v: hash_partition(v), or the placement made by the LocalityPartitioner
+    - a superstep sends a message to every shard before reading any reply, so the shards work in parallel
+    - updates are sent without waiting for a reply; each pipe delivers messages in order
+    """
+
+    def __init__(self, shards=2, partition='hash'):
+        if partition not in PARTITIONS:
+            raise ValueError(f'unknown partition {partition!r}, expected one of {PARTITIONS}')
+        self.shards = shards
+        self.partition = partition
+        self._partitioner = LocalityPartitioner(shards) if partition == 'locality' else None
+        # sequence number of the next vertex added, see _Shard.order
+        self._sequence = 0
+        context = multiprocessing.get_context()
+        self._conns = []
+        self._processes = []
+        for _ in range(shards):
+            conn, child = context.Pipe()
+            process = context.Process(target=_shard_main, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+        self._finalizer = weakref.finalize(self, _shutdown, self._conns, self._processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the shard processes. The graph can not be used afterwards.
+        """
+        self._finalizer()
+
+    def _owner(self, v):
+        """
+        Helper function which returns the shard of vertex v, or None if v has not been placed
+        """
+        if self._partitioner is None:
+            return hash_partition(v, self.shards)
+        return self._partitioner.owner.get(v)
+
+    def _place(self, v, neighbors=()) -> int:
+        """
+        Helper function which returns the shard of vertex v, placing it first if required
+        """
+        shard = self._owner(v)
+        if shard is None:
+            shard = self._partitioner.place(v, neighbors)
+            self._send(shard, 'add_vertices', [v], [self._sequence])
+            self._sequence += 1
+        return shard
+
+    def _send(self, shard: int, name: str, *args) -> None:
+        self._conns[shard].send((name, args, False))
+
+    def _call(self, shard: int, name: str, *args):
+        self._conns[shard].send((name, args, True))
+        ok, result = self._conns[shard].recv()
+        if not ok:
+            raise result
+        return result
+
+    def _superstep(self, name: str, shard_args: []) -> []:
+        """
+        Helper function which runs name(*shard_args[i]) on every shard i in parallel and returns the replies in
+        shard order
+        """
+        for conn, args in zip(self._conns, shard_args):
+            conn.send((name, args, True))
+        replies = [conn.recv() for conn in self._conns]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def _broadcast(self, name: str, *args) -> []:
+        return self._superstep(name, [args] * self.shards)
+
+    def _groups(self, items, key=None) -> []:
+        """
+        Helper function which splits items into one list per shard, by the owner of key(item) or of the item
+        itself, keeping their order. Items of vertices that have not been placed are dropped.
+        """
+        groups = [[] for _ in range(self.shards)]
+        for item in items:
+            shard = self._owner(item if key is None else key(item))
+            if shard is not None:
+                groups[shard].append(item)
+        return groups
+
+    def _aligned(self, name: str, vertices: [], default) -> []:
+        """
+        Helper function which runs the per-vertex shard query name over vertices in one superstep and returns the
+        answers in the order of vertices, default for vertices that have not been placed
+        """
+        owners = [self._owner(v) for v in vertices]
+        groups = [[] for _ in range(self.shards)]
+        for v, shard in zip(vertices, owners):
+            if shard is not None:
+                groups[shard].append(v)
+        answers = [iter(reply) for reply in self._superstep(name, [(group,) for group in groups])]
+        return [default if shard is None else next(answers[shard]) for shard in owners]
+
+    def _row(self, v) -> []:
+        """
+        Helper function which returns the row of v as an ascending list of (neighbour, weight) tuples
+        """
+        shard = self._owner(v)
+        return [] if shard is None else self._call(shard, 'rows_of', [v])[0]
+
+    def _bfs_levels(self, v_start):
+        """
+        Helper generator which runs a level-synchronous BFS from a valid vertex and yields each level as a list of
+        vertices in visit order. Each level takes two supersteps: the owners of the frontier send its rows, then
+        the owners of the vertices found mark the ones that were not visited before.
+        """
+        self._broadcast('reset')
+        self._aligned('visit', [v_start], True)
+        frontier = [v_start]
+        while len(frontier) != 0:
+            yield frontier
+            found = [u for row in self._aligned('rows_of', frontier, []) for u, _ in row]
+            frontier = list(compress(found, self._aligned('visit', found, True)))
+
+    def partition_stats(self) -> {}:
+        """
+        Returns a dict of the number of vertices on each shard, the number of edges and the number of cut edges,
+        which join vertices on different shards
+        """
+        stats = self._broadcast('stats')
+        edges, cut = sum(s[1] for s in stats), sum(s[2] for s in stats)
+        if not self.directed:
+            edges, cut = edges // 2, cut // 2
+        return {'vertices': [s[0] for s in stats], 'edges': edges, 'cut_edges': cut}
+
+    def dfs(self, v_start, v_end=None) -> []:
+        """
+        Returns the vertices visited by a depth-first search in the same order as the unsharded graph. DFS is
+        sequential, so every visited vertex costs a round trip to its shard; prefer bfs() or reachable().
+        """
+        if not self._valid_vertex(v_start):
+            return []
+
+        visited = set()
+        visited_vertices = []
+        dfs_stack = [v_start]
+        while len(dfs_stack) != 0:
+            v = dfs_stack.pop()
+            if v in visited:
+                continue
+            visited.add(v)
+            visited_vertices.append(v)
+            if v == v_end:
+                break
+            for vertex, _ in reversed(self._row(v)):
+                if vertex not in visited:
+                    dfs_stack.append(vertex)
+
+        return visited_vertices
+
+    def bfs(self, v_start, v_end=None) -> []:
+        """
+        Returns the vertices visited by a breadth-first search in the same order as the unsharded graph, computed
+        one level per two supersteps
+        """
+        if not self._valid_vertex(v_start):
+            return []
+
+        visited_vertices = []
+        for level in self._bfs_levels(v_start):
+            if v_end in level:
+                visited_vertices.extend(level[:level.index(v_end) + 1])
+                break
+            visited_vertices.extend(level)
+        return visited_vertices
+
+    def reachable(self, u, v) -> bool:
+        """
+        Returns True if there is a path from u to v, searching level by level until v is found
+        """
+        if not self._valid_vertex(u) or not self._valid_vertex(v):
+            return False
+        return any(v in level for level in self._bfs_levels(u))
+
+
+class ShardedDirectedGraph(_ShardedGraph):
+    """
+    Class to implement a directed weighted graph sharded across worker processes, see DirectedGraph
+    - vertices are numbered 0..v_count-1; removed vertices stay behind as tombstones
+    - each shard holds the out-edges of its vertices
+    - with locality partitioning, a vertex is placed when its first edge is added
+    """
+
+    directed = True
+
+    def __init__(self, start_edges=None, shards=2, partition='hash'):
+        super().__init__(shards, partition)
+        self.v_count = 0
+        self._removed = set()
+        if start_edges is not None:
+            start_edges = list(start_edges)
+            self.add_vertices(max((max(u, v) for u, v, _ in start_edges), default=0) + 1)
+            self.add_edges(start_edges)
+
+    def __str__(self):
+        """
+        Return content of the graph in the same human-readable form as DirectedGraph, gathering every row
+        """
+        if self.v_count == 0:
+            return 'EMPTY GRAPH\n'
+        out = '   |'
+        out += ' '.join(['{:2}'.format(i) for i in range(self.v_count)]) + '\n'
+        out += '-' * (self.v_count * 3 + 3) + '\n'
+        for i, edges in enumerate(self._aligned('rows_of', list(range(self.v_count)), [])):
+            row = [0] * self.v_count
+            for v, weight in edges:
+                row[v] = weight
+            out += '{:2} |'.format(i)
+            out += ' '.join(['{:2}'.format(w) for w in row]) + '\n'
+        out = f"GRAPH ({self.v_count} vertices):\n{out}"
+        return out
+
+    def _valid_vertex(self, vertex):
+        """
+        Helper function which returns True if a vertex is valid, otherwise False.
+        """
+        return 0 <= vertex < self.v_count and vertex not in self._removed
+
+    def add_vertex(self) -> int:
+        """
+        Adds a new vertex to the graph and returns the number of vertices in the graph.
+        """
+        return self.add_vertices(1)
+
+    def add_vertices(self, k: int) -> int:
+        """
+        Adds k new vertices to the graph and returns the number of vertices in the graph.
+        """
+        vertices = range(self.v_count, self.v_count + k)
+        self.v_count += k
+        if self._partitioner is None:
+            for shard, group in enumerate(self._groups(vertices)):
+                if len(group) != 0:
+                    self._send(shard, 'add_vertices', group)
+        return self.v_count
+
+    def add_edge(self, src: int, dst: int, weight=1) -> None:
+        """
+        Adds an edge to the graph. If the edge already exists, the weight of the edge is updated.
+        """
+        self.add_edges([(src, dst, weight)])
+
+    def add_edges(self, edges, chunk_size=100000) -> None:
+        """
+        Adds every (src, dst) or (src, dst, weight) edge from an iterable, following the same rules as add_edge(),
+        sending one message per shard for every chunk_size edges
+        """
+        for chunk in chunked(edges, chunk_size):
+            groups = [[] for _ in range(self.shards)]
+            for edge in chunk:
+                src, dst = edge[0], edge[1]
+                weight = edge[2] if len(edge) > 2 else 1
+                if self._valid_vertex(src) and self._valid_vertex(dst) and src != dst and weight >= 0:
+                    if self._partitioner is not None:
+                        self._place(dst, [src])
+                        groups[self._place(src, [dst])].append((src, dst, weight))
+                    else:
+                        groups[hash_partition(src, self.shards)].append((src, dst, weight))
+            for shard, group in enumerate(groups):
+                if len(group) != 0:
+                    self._send(shard, 'set_edges', group)
+
+    def remove_edge(self, src: int, dst: int) -> None:
+        """
+        Removes an edge between provided source and destination vertices
+        """
+        if self._valid_vertex(src) and self._valid_vertex(dst) and self._owner(src) is not None:
+            self._send(self._owner(src), 'set_edges', [(src, dst, 0)])
+
+    def remove_vertex(self, v: int) -> None:
+        """
+        Removes a vertex and every edge into or out of it, leaving a tombstone so the other vertices keep their
+        numbers. The edges into v are dropped by every shard in parallel.
+        """
+        if not self._valid_vertex(v):
+            return
+        shard = self._owner(v)
+        if shard is not None:
+            self._call(shard, 'remove_vertex', v)
+            for conn in range(self.shards):
+                self._send(conn, 'drop_edges_into', [v])
+        self._removed.add(v)
+
+    def get_vertices(self) -> []:
+        """
+        Returns a list of vertices in the graph
+        """
+        return [v for v in range(self.v_count) if v not in self._removed]
+
+    def get_edges(self) -> []:
+        """
+        Returns a list of (src, dst, weight) edges in row-major order, like DirectedGraph.get_edges()
+        """
+        return sorted(chain.from_iterable(self._broadcast('edges')))
+
+    def is_valid_path(self, path: []) -> bool:
+        """
+        Determines whether a given path is valid, checking all of its edges in one superstep. Like
+        DirectedGraph.is_valid_path() and validate_paths(), an empty path and any single vertex are valid, and a
+        longer path through a vertex outside the graph is not.
+        """
+        pairs = list(zip(path, path[1:]))
+        for u, v in pairs:
+            if not self._valid_vertex(u) or not self._valid_vertex(v):
+                return False
+        groups = self._groups(pairs, key=lambda pair: pair[0])
+        if sum(len(group) for group in groups) != len(pairs):
+            return False
+        return all(0 not in weights for weights in self._superstep('weights', [(group,) for group in groups]))
+
+    def has_cycle(self) -> bool:
+        """
+        If a graph contains at least one cycle, returns True, otherwise False. Runs Kahn's algorithm in supersteps:
+        every shard counts the edges into its vertices, then repeatedly removes its vertices left with no incoming
+        edges and tells the other shards how many of their vertices' incoming edges went with them. The graph has a
+        cycle exactly when some vertices are never removed.
+        """
+        messages = list(chain.from_iterable(self._broadcast('count_in_degrees')))
+        sign = 1
+        while True:
+            groups = self._groups(messages, key=lambda message: message[0])
+            messages = list(chain.from_iterable(self._superstep('peel', [(group, sign) for group in groups])))
+            sign = -1
+            if len(messages) == 0:
+                break
+        return sum(self._broadcast('remaining')) != 0
+
+    def dijkstra(self, src: int, targets=None, max_distance=None) -> []:
+        """
+        Returns the shortest distance from src to each vertex, "inf" for vertices that can't be reached, like
+        DirectedGraph.dijkstra(). Each superstep every shard runs dijkstra over its own vertices from the distances
+        it received and sends the distances it found for other shards' vertices, until no distance improves.
+        With targets, stops once every target is closer than any distance still in flight; vertices further than
+        the furthest target are then reported as "inf". Vertices further than max_distance are reported as "inf".
+        """
+        if not self._valid_vertex(src):
+            return []
+
+        inf = float('inf')
+        if isinstance(targets, int):
+            targets = [targets]
+        targets = {v for v in targets if self._valid_vertex(v)} if targets is not None else set()
+        self._superstep('reset', [(group,) for group in self._groups(targets)])
+        reached = {}
+        cutoff = inf
+        messages = [(src, 0)]
+        while len(messages) != 0:
+            groups = self._groups(messages, key=lambda message: message[0])
+            replies = self._superstep('relax', [(group, max_distance) for group in groups])
+            messages = [message for outbox, _ in replies for message in outbox]
+            for _, found in replies:
+                reached.update(found)
+            if len(targets) != 0 and len(reached) == len(targets):
+                if max(reached.values()) < min((d for _, d in messages), default=inf):
+                    cutoff = max(reached.values())
+                    break
+
+        distances = [inf] * self.v_count
+        distances[src] = 0
+        for v, d in chain.from_iterable(self._broadcast('distances')):
+            if d <= cutoff:
+                distances[v] = d
+        return distances
+
+
+class ShardedUndirectedGraph(_ShardedGraph):
+    """
+    Class to implement an undirected graph sharded across worker processes, see UndirectedGraph
+    - vertex names are strings
+    - each edge is stored in the rows of both of its vertices, on their owners' shards
+    """
+
+    directed = False
+
+    def __init__(self, start_edges=None, shards=2, partition='hash'):
+        super().__init__(shards, partition)
+        if start_edges is not None:
+            self.add_edges(start_edges)
+
+    def __str__(self):
+        """
+        Return content of the graph in the same human-readable form as UndirectedGraph, gathering every row
+        """
+        rows = sorted(chain.from_iterable(self._broadcast('ordered_rows')))
+        out = [f'{v}: {neighbors}' for _, v, neighbors in rows]
+        out = '\n  '.join(out)
+        if len(out) < 70:
+            out = out.replace('\n  ', ', ')
+            return f'GRAPH: {{{out}}}'
+        return f'GRAPH: {{\n  {out}}}'
+
+    def _valid_vertex(self, v) -> bool:
+        """
+        Helper function which returns True if v is in the graph
+        """
+        if self._partitioner is not None:
+            return v in self._partitioner.owner
+        return self._call(self._owner(v), 'has_vertices', [v])[0]
+
+    def add_vertex(self, v: str) -> None:
+        """
+        Adds a new unique vertex to the graph. If a vertex with the same value already exists, method does nothing.
+        """
+        if self._partitioner is not None:
+            self._place(v)
+        else:
+            self._send(self._owner(v), 'add_vertices', [v], [self._sequence])
+            self._sequence += 1
+
+    def add_edge(self, u: str, v: str) -> None:
+        """
+        Add edge to the graph
+        """
+        self.add_edges([(u, v)])
+
+    def add_edges(self, edges, chunk_size=100000) -> None:
+        """
+        Add every (u, v) edge from an iterable, following the same rules as add_edge(), sending one message per
+        shard for every chunk_size edges. With hash partitioning the endpoints are sent to their owners with their
+        sequence numbers first, which only number the ones that are new.
+        """
+        for chunk in chunked(edges, chunk_size):
+            groups = [[] for _ in range(self.shards)]
+            added = [([], []) for _ in range(self.shards)]
+            seen = set()
+            for u, v in chunk:
+                if u != v:
+                    for a, b in ((u, v), (v, u)):
+                        shard = self._place(a, [b])
+                        groups[shard].append((a, b, 1))
+                        if self._partitioner is None and a not in seen:
+                            seen.add(a)
+                            added[shard][0].append(a)
+                            added[shard][1].append(self._sequence)
+                            self._sequence += 1
+            for shard, group in enumerate(groups):
+                if len(added[shard][0]) != 0:
+                    self._send(shard, 'add_vertices', *added[shard])
+                if len(group) != 0:
+                    self._send(shard, 'set_edges', group)
+
+    def remove_edge(self, v: str, u: str) -> None:
+        """
+        Remove edge from the graph
+        """
+        if self._owner(u) is not None and self._owner(v) is not None:
+            self._send(self._owner(u), 'set_edges', [(u, v, 0)])
+            self._send(self._owner(v), 'set_edges', [(v, u, 0)])
+
+    def remove_vertex(self, v: str) -> None:
+        """
+        Remove vertex and all connected edges
+        """
+        shard = self._owner(v)
+        if shard is None:
+            return
+        neighbors = self._call(shard, 'remove_vertex', v)
+        if neighbors is None:
+            return
+        for shard, group in enumerate(self._groups(neighbors)):
+            if len(group) != 0:
+                self._send(shard, 'set_edges', [(u, v, 0) for u in group])
+        if self._partitioner is not None:
+            self._partitioner.remove(v)
+
+    def get_vertices(self) -> []:
+        """
+        Return list of vertices in the graph, in insertion order like UndirectedGraph
+        """
+        return [v for _, v in sorted(chain.from_iterable(self._broadcast('ordered_vertices')))]
+
+    def get_edges(self) -> []:
+        """
+        Return list of edges in the graph (any order), each as a (v, u) tuple with v < u
+        """
+        return sorted((u, v) for u, v, _ in chain.from_iterable(self._broadcast('edges')) if u < v)
+
+    def is_valid_path(self, path: []) -> bool:
+        """
+        Return true if provided path is valid, False otherwise. All of its edges are checked in one superstep.
+        """
+        if len(path) == 1:
+            return self._valid_vertex(path[0])
+        pairs = list(zip(path, path[1:]))
+        groups = self._groups(pairs, key=lambda pair: pair[0])
+        if sum(len(group) for group in groups) != len(pairs):
+            return False
+        return all(0 not in weights for weights in self._superstep('weights', [(group,) for group in groups]))
+
+    def has_cycle(self) -> bool:
+        """
+        Return True if graph contains a cycle, False otherwise. Without parallel edges, a graph is a forest exactly
+        when it has one edge less than vertices per component, so this counts the vertices and edges of every shard
+        and the connected components.
+        """
+        stats = self._broadcast('stats')
+        vertices, edges = sum(s[0] for s in stats), sum(s[1] for s in stats) // 2
+        return edges > vertices - self.count_connected_components()
+
+    def count_connected_components(self) -> int:
+        """
+        Return number of connected components in the graph. Every vertex starts with its own name as label and
+        each superstep the shards spread the smallest label through their own vertices and send it on to the
+        neighbours on other shards, until no label changes; one label per component survives.
+        """
+        self._broadcast('reset')
+        messages = list(chain.from_iterable(self._broadcast('propagate', None)))
+        while len(messages) != 0:
+            groups = self._groups(messages, key=lambda message: message[0])
+            messages = list(chain.from_iterable(self._superstep('propagate', [(group,) for group in groups])))
+        return sum(self._broadcast('roots'))
+
+
+if __name__ == '__main__':
+
+    from d_graph import DirectedGraph
+    from ud_graph import UndirectedGraph
+
+    print("\nShardedDirectedGraph against DirectedGraph")
+    print("------------------------------------------")
+    edges = [(0, 1, 10), (4, 0, 12), (1, 4, 15), (4, 3, 3),
+             (3, 1, 5), (2, 1, 23), (3, 2, 7)]
+    local = DirectedGraph(edges)
+    for partition in PARTITIONS:
+        with ShardedDirectedGraph(edges, shards=3, partition=partition) as g:
+            print(g)
+            print(str(g) == str(local), g.has_cycle() == local.has_cycle(), g.dijkstra(0) == local.dijkstra(0))
+            g.remove_edge(1, 4)
+            local.remove_edge(1, 4)
+            print(g.has_cycle(), local.has_cycle(), g.bfs(0) == local.bfs(0))
+            local.add_edge(1, 4, 15)
+
+    print("\nShardedUndirectedGraph against UndirectedGraph")
+    print("----------------------------------------------")
+    edges = ['AB', 'AC', 'BC', 'BD', 'CD', 'CE', 'DE', 'DH', 'EH', 'GF']
+    local = UndirectedGraph(edges)
+    for partition in PARTITIONS:
+        with ShardedUndirectedGraph(edges, shards=3, partition=partition) as g:
+            print(g)
+            print(str(g) == str(local), g.has_cycle() == local.has_cycle(),
+                  g.count_connected_components() == local.count_connected_components())
@@ -6,7 +6,223 @@
 # or not there is are specific cycles.
 
 import heapq
+from array import array
 from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+
+from csr import CSR, FrozenRows, level_bfs, pack_rows
+from graph_file import chunked, iter_edge_file, read_graph, write_graph
+from instrumentation import GraphStats, timed_method
+from query_cache import QueryCache, cached_method
+
+
+class _Neighbors:
+    """
+    Class to implement the neighbour set of a single vertex, holding vertex ids
+    - membership checks, insertion and removal are O(1)
+    - ordered() lists the neighbours in alphabetical order of their names, cached until the next mutation
+    """
+
+    __slots__ = ('_set', '_sorted')
+
+    def __init__(self, ids=()):
+        self._set = set(ids)
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._set)
+
+    def __contains__(self, i):
+        return i in self._set
+
+    def __iter__(self):
+        return iter(self._set)
+
+    def ordered(self, names: []) -> []:
+        """
+        Returns the neighbour ids sorted by name, with names[i] being the name of vertex id i
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self._set, key=names.__getitem__)
+        return self._sorted
+
+    def add(self, i) -> None:
+        if i not in self._set:
+            self._set.add(i)
+            self._sorted = None
+
+    def discard(self, i) -> None:
+        if i in self._set:
+            self._set.discard(i)
+            self._sorted = None
+
+
+class _NeighborView:
+    """
+    Class to implement a read-only view of the neighbours of one vertex by name, iterated in alphabetical order.
+    A view is valid until the graph is next modified.
+    """
+
+    __slots__ = ('_graph', '_id')
+
+    def __init__(self, graph, i: int):
+        self._graph = graph
+        self._id = i
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __len__(self):
+        return self._graph._degree(self._id)
+
+    def __contains__(self, v):
+        i = self._graph._ids.get(v)
+        return i is not None and self._graph._adjacent(self._id, i)
+
+    def __iter__(self):
+        names = self._graph._names
+        return (names[i] for i in self._graph._neighbors(self._id))
+
+    def __reversed__(self):
+        names = self._graph._names
+        return (names[i] for i in reversed(self._graph._neighbors(self._id)))
+
+
+class _AdjacencyView(Mapping):
+    """
+    Class to implement the read-only {vertex: neighbours} mapping returned by UndirectedGraph.adj_list
+    """
+
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, v):
+        return _NeighborView(self._graph, self._graph._ids[v])
+
+    def __iter__(self):
+        return iter(self._graph._ids)
+
+    def __len__(self):
+        return len(self._graph._ids)
+
+    def __contains__(self, v):
+        return v in self._graph._ids
+
+
+class _ComponentIndex:
+    """
+    Class to implement an incrementally maintained connected components index
+    - every vertex carries a component label and each label keeps a set of its members
+    - joining two components relabels the smaller one, so a vertex is relabelled at most O(log V) times
+    - splitting a component moves the vertices that were cut off to a new label
+    """
+
+    def __init__(self):
+        self.label = dict()
+        self.members = dict()
+        self._next_label = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def add_component(self, vertices) -> None:
+        """
+        Adds a new component made of the given vertices, which must not be labelled yet
+        """
+        members = set(vertices)
+        for v in members:
+            self.label[v] = self._next_label
+        self.members[self._next_label] = members
+        self._next_label += 1
+
+    def discard(self, v) -> None:
+        """
+        Removes a vertex from its component, dropping the component if it becomes empty
+        """
+        label = self.label.pop(v)
+        self.members[label].discard(v)
+        if not self.members[label]:
+            del self.members[label]
+
+    def union(self, u, v) -> None:
+        """
+        Merges the components of u and v
+        """
+        a, b = self.label[u], self.label[v]
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        for vertex in self.members[b]:
+            self.label[vertex] = a
+        self.members[a] |= self.members.pop(b)
+
+    def split(self, vertices) -> None:
+        """
+        Moves the given vertices, all from the same component, to a new component
+        """
+        old = self.label[next(iter(vertices))]
+        self.members[old] -= vertices
+        self.add_component(vertices)
+
+    def remap(self, new_ids) -> None:
+        """
+        Renames every vertex v to new_ids[v], keeping the component labels
+        """
+        self.label = {new_ids[v]: label for v, label in self.label.items()}
+        for label, members in self.members.items():
+            self.members[label] = {new_ids[v] for v in members}
+
+
+def _iter_dfs(neighbors, names: [], start: int, max_depth=None, details=False):
+    """
+    Generator which runs the DFS of UndirectedGraph.iter_dfs() from vertex id start, reading the neighbour ids of
+    each vertex in traversal order with neighbors(i) and naming vertex id i names[i]
+    """
+    visited = set()
+    dfs_stack = [(start, 0, -1)]
+    while len(dfs_stack) != 0:
+        v, depth, parent = dfs_stack.pop()
+        if v in visited:
+            continue
+        visited.add(v)
+        yield (names[v], depth, names[parent] if parent >= 0 else None) if details else names[v]
+        if max_depth is None or depth < max_depth:
+            for vertex in reversed(neighbors(v)):
+                if vertex not in visited:
+                    dfs_stack.append((vertex, depth + 1, v))
+
+
+def _iter_bfs(neighbors, names: [], start: int, max_depth=None, details=False):
+    """
+    Generator which runs the BFS of UndirectedGraph.iter_bfs() from vertex id start, see _iter_dfs()
+    """
+    discovered = {start}
+    bfs_queue = deque([(start, 0, -1)])
+    while len(bfs_queue) != 0:
+        v, depth, parent = bfs_queue.popleft()
+        yield (names[v], depth, names[parent] if parent >= 0 else None) if details else names[v]
+        if max_depth is None or depth < max_depth:
+            for vertex in neighbors(v):
+                if vertex not in discovered:
+                    discovered.add(vertex)
+                    bfs_queue.append((vertex, depth + 1, v))
+
+
+def _iter_edges(neighbors, ids: {}, names: []):
+    """
+    Generator which yields the edges of UndirectedGraph.iter_edges() from the {name: id} dict ids, see _iter_dfs()
+    """
+    rank = [0] * len(names)
+    for position, i in enumerate(ids.values()):
+        rank[i] = position
+    for v, i in ids.items():
+        for j in neighbors(i):
+            if rank[j] > rank[i]:
+                yield v, names[j]
 
 
 class UndirectedGraph:
@@ -16,8 +232,33 @@ class UndirectedGraph:
     - loops not allowed
     - no edge weights
     - vertex names are strings
+    - vertex names are interned to integer ids, adjacency is stored by id and names are only used at the API boundary
     """
 
+    # connected components index, built on first use and maintained by the mutating methods
+    _components = None
+    # max vertices explored when checking whether a removed edge split its component
+    split_search_limit = 10000
+    # cached cycle witness, see find_cycle(); None until computed
+    _cycle = None
+    # modified rows tolerated before compact() runs, at least a quarter of the vertices
+    min_dirty_rows = 1024
+    # query result cache, see enable_cache(); _version is bumped whenever the graph changes
+    _cache = None
+    _version = 0
+    _CACHED_QUERIES = ('dfs', 'bfs', 'is_valid_path')
+    # last snapshot returned by freeze(), the rows changed since and whether vertices were added or removed
+    _snapshot = None
+    _snapshot_rows = None
+    _snapshot_vertices = False
+    # (version, {(i, j), ...}) index of adjacent vertex id pairs used by validate_paths()
+    _pair_index = None
+    # instrumentation stats, see enable_stats()
+    _stats = None
+    _INSTRUMENTED = ('add_vertex', 'add_edge', 'add_edges', 'remove_edge', 'remove_vertex', 'get_edges',
+                     'is_valid_path', 'validate_paths', 'dfs', 'bfs', 'level_bfs', 'count_connected_components',
+                     'has_cycle', 'find_cycle', 'reachable')
+
     def __init__(self, start_edges=None):
         """
         Store graph info as adjacency list
@@ -44,41 +285,360 @@ class UndirectedGraph:
         return f'GRAPH: {{\n  {out}}}'
 
     # ------------------------------------------------------------------ #
+    @property
+    def adj_list(self) -> Mapping:
+        """
+        Read-only {vertex: neighbours} mapping over the interned adjacency, neighbours iterate in alphabetical order
+        """
+        return _AdjacencyView(self)
+
+    @adj_list.setter
+    def adj_list(self, adjacency) -> None:
+        """
+        Replaces the graph with the vertices and edges of a {vertex: neighbours} mapping.
+        Vertex i is named _names[i] (None once removed) and _ids maps names back to ids in insertion order. Row i of
+        the adjacency is _rows[i], or the CSR row _base.neighbors(i) while _rows[i] is None.
+        """
+        self._ids = dict()
+        self._names = []
+        self._rows = []
+        self._free = []
+        self._base = CSR(weighted=False)
+        self._dirty = 0
+        self._edge_count = 0
+        self._components = None
+        self._cycle = None
+        self._snapshot = None
+        self._version += 1
+        for v in adjacency:
+            self.add_vertex(v)
+        for v in adjacency:
+            for u in adjacency[v]:
+                self.add_edge(v, u)
+
+    def enable_cache(self, maxsize=1024) -> QueryCache:
+        """
+        Turns on an LRU cache of up to maxsize dfs(), bfs() and is_valid_path() results and returns it; its hits and
+        misses attributes count lookups. Cached results are never served after the graph changes.
+        """
+        self._cache = QueryCache(maxsize)
+        self._install_wrappers()
+        return self._cache
+
+    def disable_cache(self) -> None:
+        """
+        Turns off the query result cache and drops its entries
+        """
+        self._cache = None
+        self._install_wrappers()
+
+    def enable_stats(self, sink=None) -> GraphStats:
+        """
+        Turns on instrumentation and returns the GraphStats collecting it: call counts and latency histograms for
+        the public methods, and the counters of bfs(): vertices visited, levels and the largest frontier, with the
+        size of every frontier passed to sinks. sink, if provided, is called with an event dict for every call and
+        counter report. Without instrumentation the methods run unwrapped.
+        """
+        self._stats = GraphStats()
+        if sink is not None:
+            self._stats.add_sink(sink)
+        self._install_wrappers()
+        return self._stats
+
+    def disable_stats(self) -> None:
+        """
+        Turns off instrumentation
+        """
+        self._stats = None
+        self._install_wrappers()
+
+    def _install_wrappers(self) -> None:
+        """
+        Helper function which rebuilds the per-instance method wrappers of the query cache and the instrumentation.
+        Methods neither one is enabled for are looked up on the class again.
+        """
+        for name in self._CACHED_QUERIES + self._INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        if self._cache is not None:
+            for name in self._CACHED_QUERIES:
+                setattr(self, name, cached_method(self, self._cache, name))
+        if self._stats is not None:
+            for name in self._INSTRUMENTED:
+                setattr(self, name, timed_method(self, self._stats, name))
+
+    def freeze(self) -> 'FrozenUndirectedGraph':
+        """
+        Return an immutable, read-optimized snapshot of the graph, see FrozenUndirectedGraph. Consecutive snapshots
+        share the blocks of rows that did not change in between, and the vertex table while no vertex was added or
+        removed. compact() renumbers every vertex, so the snapshot after it is built from scratch. Freezing an
+        unchanged graph returns the previous snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+        if snapshot is None:
+            rows = FrozenRows.from_rows(self._neighbors, len(self._names), weighted=False)
+        else:
+            rows = snapshot._rows.replace(self._neighbors, self._snapshot_rows, len(self._names))
+        if snapshot is None or self._snapshot_vertices:
+            ids, names = dict(self._ids), list(self._names)
+        else:
+            ids, names = snapshot._ids, snapshot._names
+        self._snapshot = FrozenUndirectedGraph(rows, ids, names, self._edge_count, self._version)
+        self._snapshot_rows = set()
+        self._snapshot_vertices = False
+        return self._snapshot
+
+    def _intern(self, v) -> int:
+        """
+        Helper function which returns the id of vertex v, adding v to the graph if required
+        """
+        i = self._ids.get(v)
+        if i is None:
+            if len(self._free) != 0:
+                i = self._free.pop()
+                self._names[i] = v
+            else:
+                i = len(self._names)
+                self._names.append(v)
+                self._rows.append(_Neighbors())
+                self._dirty += 1
+            self._ids[v] = i
+            self._version += 1
+            self._snapshot_vertices = True
+            if self._components is not None:
+                self._components.add_component([i])
+        return i
+
+    def _neighbors(self, i: int):
+        """
+        Helper function which returns the neighbour ids of vertex id i in alphabetical order of their names
+        """
+        row = self._rows[i]
+        if row is None:
+            return self._base.neighbors(i)
+        return row.ordered(self._names)
+
+    def _degree(self, i: int) -> int:
+        """
+        Helper function which returns the degree of vertex id i
+        """
+        row = self._rows[i]
+        if row is None:
+            return self._base.degree(i)
+        return len(row)
+
+    def _adjacent(self, i: int, j: int) -> bool:
+        """
+        Helper function which returns True if vertex ids i and j are adjacent
+        """
+        row = self._rows[i]
+        if row is None:
+            return self._base.get(i, j) != 0
+        return j in row
+
+    def _writable_row(self, i: int) -> _Neighbors:
+        """
+        Helper function which returns the neighbour set of vertex id i, copying it out of the CSR if required
+        """
+        row = self._rows[i]
+        if row is None:
+            row = self._rows[i] = _Neighbors(self._base.neighbors(i))
+            self._dirty += 1
+        if self._snapshot is not None:
+            self._snapshot_rows.add(i)
+        return row
+
+    def _maybe_compact(self) -> None:
+        """
+        Helper function which compacts the adjacency once enough rows have been modified
+        """
+        if self._dirty > max(self.min_dirty_rows, len(self._ids) // 4):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Packs every neighbour set into CSR arrays and renumbers the vertex ids in alphabetical order of their names,
+        so each row lists its neighbours in traversal order. Runs automatically as rows are modified.
+        """
+        names = sorted(self._ids)
+        new_ids = [-1] * len(self._names)
+        for i, name in enumerate(names):
+            new_ids[self._ids[name]] = i
+        offsets = array('q', [0])
+        targets = array('q')
+        for name in names:
+            targets.extend([new_ids[j] for j in self._neighbors(self._ids[name])])
+            offsets.append(len(targets))
+
+        self._ids = {name: new_ids[i] for name, i in self._ids.items()}
+        self._names = names
+        self._rows = [None] * len(names)
+        self._free = []
+        self._base = CSR(offsets, targets, weighted=False)
+        self._dirty = 0
+        self._snapshot = None
+        self._pair_index = None
+        if self._components is not None:
+            self._components.remap(new_ids)
+
+    def _to_csr(self) -> (CSR, []):
+        """
+        Helper function which returns an unweighted CSR of the graph and the list of vertex names indexed by CSR row.
+        Ids are in alphabetical order, so each row lists neighbours in traversal order.
+        """
+        if self._dirty != 0 or len(self._base) != len(self._ids):
+            self.compact()
+        return self._base, self._names
+
+    def save(self, path) -> None:
+        """
+        Writes the graph to a binary graph file, see graph_file.py. Vertex names must be strings.
+        """
+        csr, names = self._to_csr()
+        write_graph(path, 'u', csr, list(self._ids.values()), names)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Reads a graph written by save(). With mmap the adjacency arrays are memory mapped and each vertex reads its
+        neighbours from the file in place until it is first modified, otherwise the file is read into memory.
+        """
+        kind, csr, order, names = read_graph(path, use_mmap=mmap)
+        if kind != 'u':
+            raise ValueError(f'{path} does not hold an undirected graph')
+        graph = cls()
+        graph._names = names
+        graph._ids = {names[i]: i for i in order}
+        graph._rows = [None] * len(names)
+        graph._base = csr
+        graph._edge_count = csr.num_edges() // 2
+        return graph
+
     def _is_adjacent(self, u: str, v: str):
         """
         Helper function which returns True of two vertices are adjacent, otherwise returns False
         """
-        if u not in self.adj_list or v not in self.adj_list:
-            return False
-        elif u in self.adj_list[v]:
-            return True
-        else:
+        i, j = self._ids.get(u), self._ids.get(v)
+        if i is None or j is None:
             return False
+        return self._adjacent(j, i)
 
     def _get_degree(self, v: str):
         """
         Helper function which returns the degree of a vertex
         """
-        return len(self.adj_list[v])
+        return self._degree(self._ids[v])
+
+    def _reach(self, start: int) -> set:
+        """
+        Helper function which returns the set of vertex ids connected to vertex id start
+        """
+        seen = {start}
+        bfs_queue = deque([start])
+        while len(bfs_queue) != 0:
+            for neighbor in self._neighbors(bfs_queue.popleft()):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    bfs_queue.append(neighbor)
+        return seen
+
+    def _component_index(self) -> _ComponentIndex:
+        """
+        Helper function which returns the connected components index over vertex ids, building it if required
+        """
+        if self._components is None:
+            index = _ComponentIndex()
+            for i in self._ids.values():
+                if i not in index.label:
+                    index.add_component(self._reach(i))
+            self._components = index
+        return self._components
+
+    def _cut_side(self, u: int, v: int):
+        """
+        Helper function called after the edge between vertex ids u and v was removed. Searches outward from u and v
+        in lockstep and returns the set of ids on the side that got disconnected, an empty set if u and v are still
+        connected, or None if the search gave up after split_search_limit vertices.
+        """
+        sides = [({u}, deque([u])), ({v}, deque([v]))]
+        explored = 0
+        while explored < self.split_search_limit:
+            for i in range(2):
+                seen, queue = sides[i]
+                other = sides[1 - i][0]
+                if len(queue) == 0:
+                    return seen
+                vertex = queue.popleft()
+                for neighbor in self._neighbors(vertex):
+                    if neighbor in other:
+                        return set()
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        queue.append(neighbor)
+                explored += 1
+        return None
 
     def add_vertex(self, v: str) -> None:
         """
         Adds a new unique vertex to the graph. If a vertex with the same value already exists, method does nothing.
         """
-        self.adj_list.setdefault(v, [])
+        self._intern(v)
 
     def add_edge(self, u: str, v: str) -> None:
         """
         Add edge to the graph
         """
         if u != v:
-            for vertex in [u, v]:
-                self.add_vertex(vertex)
-            if not self._is_adjacent(u, v):
-                self.adj_list[u].append(v)
-                self.adj_list[v].append(u)
-                self.adj_list[u].sort()
-                self.adj_list[v].sort()
+            i, j = self._intern(u), self._intern(v)
+            if self._adjacent(i, j):
+                return
+            # a new edge inside a component closes a cycle through the existing u-v path
+            if self._cycle is not None and len(self._cycle) == 0 and self.same_component(u, v):
+                self._cycle = self._find_path(i, j)
+            self._writable_row(i).add(j)
+            self._writable_row(j).add(i)
+            self._edge_count += 1
+            self._version += 1
+            if self._components is not None:
+                self._components.union(i, j)
+            self._maybe_compact()
+
+    def add_edges(self, edges, chunk_size=100000) -> None:
+        """
+        Add every (u, v) edge from an iterable, following the same rules as add_edge(). The iterable is consumed
+        chunk_size edges at a time. Loops and duplicates are dropped in bulk, and neighbour lists are sorted once
+        when they are next read instead of after every insert.
+        """
+        self._components = None
+        self._cycle = None
+        self._version += 1
+        ids = self._ids
+        for chunk in chunked(edges, chunk_size):
+            for u, v in chunk:
+                if u != v:
+                    i = ids.get(u)
+                    if i is None:
+                        i = self._intern(u)
+                    j = ids.get(v)
+                    if j is None:
+                        j = self._intern(v)
+                    row = self._writable_row(i)
+                    if j not in row:
+                        row.add(j)
+                        self._writable_row(j).add(i)
+                        self._edge_count += 1
+        self._maybe_compact()
+
+    @classmethod
+    def from_edge_file(cls, path, chunk_size=100000):
+        """
+        Build a graph from a text edge list with one "u v" edge per line, see iter_edge_file(). The file is read
+        chunk_size lines at a time.
+        """
+        graph = cls()
+        graph.add_edges(((fields[0], fields[1]) for fields in iter_edge_file(path)), chunk_size)
+        return graph
 
     def remove_edge(self, v: str, u: str) -> None:
         """
@@ -87,21 +647,56 @@ class UndirectedGraph:
         if not self._is_adjacent(u, v):
             return
 
-        self.adj_list[u].remove(v)
-        self.adj_list[v].remove(u)
+        i, j = self._ids[u], self._ids[v]
+        self._writable_row(i).discard(j)
+        self._writable_row(j).discard(i)
+        self._edge_count -= 1
+        self._version += 1
+
+        if self._cycle and self._on_cycle(u, v):
+            self._cycle = None
+        if self._components is not None:
+            side = self._cut_side(i, j)
+            if side is None:
+                self._components = None
+            elif side:
+                self._components.split(side)
+        self._maybe_compact()
 
     def remove_vertex(self, v: str) -> None:
         """
         Remove vertex and all connected edges
         """
-        if v not in self.adj_list:
+        i = self._ids.get(v)
+        if i is None:
             return
 
-        for vertex in self.adj_list:
-            if v in self.adj_list[vertex]:
-                self.adj_list[vertex].remove(v)
+        for j in self._neighbors(i):
+            self._writable_row(j).discard(i)
+        self._edge_count -= self._degree(i)
+        self._version += 1
+
+        if self._cycle and v in self._cycle:
+            self._cycle = None
 
-        self.adj_list.pop(v, None)
+        # dropping a vertex with a single neighbour cannot split its component
+        if self._components is not None:
+            if self._degree(i) <= 1:
+                self._components.discard(i)
+            else:
+                self._components = None
+
+        # the id is recycled by the next new vertex
+        del self._ids[v]
+        self._names[i] = None
+        if self._rows[i] is None:
+            self._dirty += 1
+        self._rows[i] = _Neighbors()
+        self._free.append(i)
+        self._snapshot_vertices = True
+        if self._snapshot is not None:
+            self._snapshot_rows.add(i)
+        self._maybe_compact()
 
     def get_vertices(self) -> []:
         """
@@ -118,15 +713,28 @@ class UndirectedGraph:
         """
         Return list of edges in the graph (any order)
         """
-        edge_list = []
+        return list(self.iter_edges())
 
-        for v in self.adj_list:
-            for u in self.adj_list[v]:
-                if (u, v) not in edge_list:
-                    edge_list.append((v, u))
+    def iter_edges(self):
+        """
+        Generator yielding every edge once as a (v, u) tuple in O(V + E). Vertices are visited in insertion order and
+        their neighbours in alphabetical order, and an edge is emitted from whichever end was added to the graph first.
+        The graph must not be modified while iterating.
+        """
+        return _iter_edges(self._neighbors, self._ids, self._names)
 
-        return edge_list
-        
+    def num_edges(self) -> int:
+        """
+        Return number of edges in the graph, kept up to date as the graph changes
+        """
+        return self._edge_count
+
+    def degree(self, v: str) -> int:
+        """
+        Return number of vertices adjacent to v, or 0 if v is not in the graph
+        """
+        i = self._ids.get(v)
+        return 0 if i is None else self._degree(i)
 
     def is_valid_path(self, path: []) -> bool:
         """
@@ -148,25 +756,40 @@ class UndirectedGraph:
 
             return True
 
+    def validate_paths(self, paths, offsets=None) -> []:
+        """
+        Return list holding is_valid_path() of each path in a batch. paths is a list of paths, or a flat sequence of
+        vertices when offsets is provided, with path i being paths[offsets[i]:offsets[i + 1]] like a CSR row.
+        Vertex names are interned in one pass and every consecutive pair is checked against a hashed set of
+        adjacent id pairs, which is kept until the graph changes.
+        """
+        if offsets is None:
+            paths, offsets = pack_rows(paths)
+        if self._pair_index is None or self._pair_index[0] != self._version:
+            pairs = {(i, j) for i in self._ids.values() for j in self._neighbors(i)}
+            self._pair_index = (self._version, pairs)
+        ids = list(map(self._ids.get, paths))
+        adjacent = list(map(self._pair_index[1].__contains__, zip(ids, islice(ids, 1, None))))
+
+        valid = []
+        for start, end in zip(offsets, islice(offsets, 1, None)):
+            # pairs that straddle two paths are checked too, but only adjacent[start:end - 1] belongs to this one
+            if end - start < 2:
+                valid.append(end == start or ids[start] is not None)
+            else:
+                valid.append(False not in adjacent[start:end - 1])
+        return valid
+
     def dfs(self, v_start, v_end=None) -> []:
         """
         Return list of vertices visited during DFS search
         Vertices are picked in alphabetical order
         """
-        if v_start not in self.adj_list:
-            return []
-
         visited_vertices = []
-        dfs_stack = [v_start]
-        while len(dfs_stack) != 0:
-            v = dfs_stack.pop()
-            if v not in visited_vertices:
-                visited_vertices.append(v)
-                for vertex in reversed(self.adj_list[v]):
-                    if vertex not in visited_vertices:
-                        dfs_stack.append(vertex)
+        for v in self.iter_dfs(v_start):
+            visited_vertices.append(v)
             if v == v_end:
-                return visited_vertices
+                break
 
         return visited_vertices
 
@@ -175,64 +798,291 @@ class UndirectedGraph:
         Return list of vertices visited during BFS search
         Vertices are picked in alphabetical order
         """
-        if v_start not in self.adj_list:
-            return []
+        if self._stats is not None:
+            return self._counted_bfs(v_start, v_end)
 
         visited_vertices = []
-        bfs_queue = deque()
-        bfs_queue.append(v_start)
-        while len(bfs_queue) != 0:
-            v = bfs_queue.popleft()
-            if v not in visited_vertices:
-                visited_vertices.append(v)
-                for vertex in self.adj_list[v]:
-                    if vertex not in visited_vertices:
-                        bfs_queue.append(vertex)
+        for v in self.iter_bfs(v_start):
+            visited_vertices.append(v)
             if v == v_end:
-                return visited_vertices
+                break
 
         return visited_vertices
-        
+
+    def _counted_bfs(self, v_start, v_end) -> []:
+        """
+        Helper function which runs bfs() while counting the vertices found at each depth, and reports the frontier
+        sizes to the instrumentation stats
+        """
+        visited_vertices = []
+        frontier_sizes = []
+        for v, depth, _ in self.iter_bfs(v_start, details=True):
+            visited_vertices.append(v)
+            if depth == len(frontier_sizes):
+                frontier_sizes.append(0)
+            frontier_sizes[depth] += 1
+            if v == v_end:
+                break
+
+        counters = {'vertices_visited': len(visited_vertices), 'levels': len(frontier_sizes),
+                    'max_frontier': max(frontier_sizes, default=0)}
+        self._stats.count('bfs', counters, frontier_sizes=frontier_sizes)
+        return visited_vertices
+
+    def iter_dfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator yielding vertices lazily in DFS order, or (vertex, depth, parent) tuples with details
+        Vertices are picked in alphabetical order, vertices deeper than max_depth are not explored
+        """
+        start = self._ids.get(v_start)
+        if start is None:
+            return
+
+        yield from _iter_dfs(self._neighbors, self._names, start, max_depth, details)
+
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator yielding vertices lazily in BFS order, or (vertex, depth, parent) tuples with details
+        Vertices are picked in alphabetical order, vertices deeper than max_depth are not explored
+        """
+        start = self._ids.get(v_start)
+        if start is None:
+            return
+
+        yield from _iter_bfs(self._neighbors, self._names, start, max_depth, details)
+
+    def level_bfs(self, v_start, workers=None) -> ([], {}, {}):
+        """
+        Return the visit order, hop distances and BFS tree parents of a level-synchronous BFS, see csr.level_bfs()
+        Distances and parents are dicts keyed by the vertices reached, the parent of v_start is None
+        """
+        if v_start not in self._ids:
+            return [], {}, {}
+
+        csr, names = self._to_csr()
+        order, distance, parent = level_bfs(csr, self._ids[v_start], csr, workers)
+        distances = {names[i]: distance[i] for i in order}
+        parents = {names[i]: names[parent[i]] if parent[i] >= 0 else None for i in order}
+        return [names[i] for i in order], distances, parents
 
     def count_connected_components(self):
         """
         Return number of connected componets in the graph
         """
-        count = 0
-        counted_vertices = []
-        for v in self.adj_list:
-            if v not in counted_vertices:
-                counted_vertices = counted_vertices + self.dfs(v)
-                count += 1
+        return len(self._component_index())
+
+    def component_of(self, v: str):
+        """
+        Return an id for the connected component containing v, or None if v is not in the graph.
+        Ids can be compared with each other but may change when the graph is modified.
+        """
+        return self._component_index().label.get(self._ids.get(v))
+
+    def same_component(self, u: str, v: str) -> bool:
+        """
+        Return True if u and v are both in the graph and connected, False otherwise
+        """
+        label = self.component_of(u)
+        return label is not None and label == self.component_of(v)
 
-        return count
+    def reachable(self, u: str, v: str) -> bool:
+        """
+        Return True if there is a path between u and v, False otherwise. Answered from the connected components
+        index, which is kept up to date as the graph changes.
+        """
+        return self.same_component(u, v)
 
     def has_cycle(self):
         """
         Return True if graph contains a cycle, False otherwise
         """
-        for v in self.adj_list:
-            visited_vertices = []
-            dfs_stack = [v]
-            par = v
-            while len(dfs_stack) != 0:
-                temp = par
-                par = v
-                v = dfs_stack.pop()
-                if v == par:
-                    par = temp
-                if v in visited_vertices and v != par:
-                    return True
-
-                if v not in visited_vertices:
-                    visited_vertices.append(v)
-                    for vertex in reversed(self.adj_list[v]):
-                        if vertex not in visited_vertices:
-                            dfs_stack.append(vertex)
+        return len(self.find_cycle()) != 0
 
+    def find_cycle(self) -> []:
+        """
+        Return list of vertices [v0, v1, ..., vk] forming a cycle, where each vertex is adjacent to the next and vk
+        is adjacent to v0, or an empty list if the graph has no cycle. The result is cached and kept up to date as
+        the graph changes.
+        """
+        if self._cycle is None:
+            self._cycle = self._search_cycle()
+        return list(self._cycle)
+
+    def _search_cycle(self) -> []:
+        """
+        Helper function which runs a single iterative DFS over every component, tracking each vertex's parent, and
+        returns the names of the first cycle found or an empty list
+        """
+        visited = set()
+        for root in self._ids.values():
+            if root in visited:
+                continue
+            visited.add(root)
+            path = [root]
+            on_path = {root: 0}
+            iterators = [iter(self._neighbors(root))]
+            while len(iterators) != 0:
+                parent = path[-2] if len(path) > 1 else -1
+                for vertex in iterators[-1]:
+                    if vertex == parent:
+                        continue
+                    if vertex in on_path:
+                        return [self._names[i] for i in path[on_path[vertex]:]]
+                    if vertex not in visited:
+                        visited.add(vertex)
+                        on_path[vertex] = len(path)
+                        path.append(vertex)
+                        iterators.append(iter(self._neighbors(vertex)))
+                        break
+                else:
+                    iterators.pop()
+                    on_path.pop(path.pop())
+        return []
+
+    def _find_path(self, u: int, v: int):
+        """
+        Helper function which returns the names of the vertices on a path from vertex id u to vertex id v, or None
+        if there is no path
+        """
+        parents = {u: -1}
+        bfs_queue = deque([u])
+        while len(bfs_queue) != 0:
+            vertex = bfs_queue.popleft()
+            if vertex == v:
+                path = []
+                while vertex >= 0:
+                    path.append(self._names[vertex])
+                    vertex = parents[vertex]
+                return path[::-1]
+            for neighbor in self._neighbors(vertex):
+                if neighbor not in parents:
+                    parents[neighbor] = vertex
+                    bfs_queue.append(neighbor)
+        return None
+
+    def _on_cycle(self, u: str, v: str) -> bool:
+        """
+        Helper function which returns True if u-v is one of the edges of the cached cycle
+        """
+        cycle = self._cycle
+        for i in range(len(cycle)):
+            if {cycle[i], cycle[(i + 1) % len(cycle)]} == {u, v}:
+                return True
         return False
 
 
+class FrozenUndirectedGraph:
+    """
+    Class to implement an immutable snapshot of an UndirectedGraph, returned by UndirectedGraph.freeze()
+    - neighbour ids are held in a FrozenRows table of CSR blocks, in alphabetical order of their names
+    - the table and the {name: id} vertex table are shared with the snapshots taken before and after it
+    - answers the read queries of UndirectedGraph as the graph stood when it was frozen
+    - nothing is cached or written while reading, so a snapshot can be queried from many threads without locks
+    - version is the graph version the snapshot was taken at
+    """
+
+    __slots__ = ('_rows', '_ids', '_names', '_edge_count', 'version')
+
+    def __init__(self, rows: FrozenRows, ids: {}, names: [], edge_count: int, version: int):
+        self._rows = rows
+        self._ids = ids
+        self._names = names
+        self._edge_count = edge_count
+        self.version = version
+
+    def _is_adjacent(self, u: str, v: str) -> bool:
+        """
+        Helper function which returns True of two vertices are adjacent, otherwise returns False
+        """
+        i, j = self._ids.get(u), self._ids.get(v)
+        if i is None or j is None:
+            return False
+        return j in self._rows.neighbors(i)
+
+    def get_vertices(self) -> []:
+        """
+        Return list of vertices in the snapshot, in the order they were added
+        """
+        return list(self._ids)
+
+    def get_edges(self) -> []:
+        """
+        Return list of edges in the snapshot, see UndirectedGraph.iter_edges()
+        """
+        return list(self.iter_edges())
+
+    def iter_edges(self):
+        """
+        Generator yielding every edge once as a (v, u) tuple, see UndirectedGraph.iter_edges()
+        """
+        return _iter_edges(self._rows.neighbors, self._ids, self._names)
+
+    def num_edges(self) -> int:
+        return self._edge_count
+
+    def degree(self, v: str) -> int:
+        """
+        Return number of vertices adjacent to v, or 0 if v is not in the snapshot
+        """
+        i = self._ids.get(v)
+        return 0 if i is None else self._rows.degree(i)
+
+    def is_valid_path(self, path: []) -> bool:
+        """
+        Return true if provided path is valid, False otherwise. A single vertex is valid if it is in the snapshot.
+        """
+        if len(path) == 1:
+            return path[0] in self._ids
+        for u, v in zip(path, path[1:]):
+            if not self._is_adjacent(u, v):
+                return False
+        return True
+
+    def dfs(self, v_start, v_end=None) -> []:
+        """
+        Return list of vertices visited during DFS search, see UndirectedGraph.dfs()
+        """
+        visited_vertices = []
+        for v in self.iter_dfs(v_start):
+            visited_vertices.append(v)
+            if v == v_end:
+                break
+
+        return visited_vertices
+
+    def bfs(self, v_start, v_end=None) -> []:
+        """
+        Return list of vertices visited during BFS search, see UndirectedGraph.bfs()
+        """
+        visited_vertices = []
+        for v in self.iter_bfs(v_start):
+            visited_vertices.append(v)
+            if v == v_end:
+                break
+
+        return visited_vertices
+
+    def iter_dfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator yielding vertices lazily in DFS order, see UndirectedGraph.iter_dfs()
+        """
+        start = self._ids.get(v_start)
+        if start is None:
+            return
+
+        yield from _iter_dfs(self._rows.neighbors, self._names, start, max_depth, details)
+
+    def iter_bfs(self, v_start, max_depth=None, details=False):
+        """
+        Generator yielding vertices lazily in BFS order, see UndirectedGraph.iter_bfs()
+        """
+        start = self._ids.get(v_start)
+        if start is None:
+            return
+
+        yield from _iter_bfs(self._rows.neighbors, self._names, start, max_depth, details)
+
+
 if __name__ == '__main__':
 
     print("\nPDF - method add_vertex() / add_edge example 1")